@@ -0,0 +1,215 @@
+"""
+Offline batch cleaning — runs the /process-excel/ pipeline over directories
+or globs of scraper dumps, one file per process, without the HTTP server.
+
+    python batch_clean.py dumps/ -o cleaned/
+    python batch_clean.py "campaign_*/**/*.xlsx" -o cleaned/ --output csv --engine columnar --jobs 8
+
+Each input gets <name>.cleaned.<ext> in the output directory, and
+combined.cleaned.<ext> holds all inputs cleaned as one dump (dedup and the
+one-email-per-Name rule applied across files). The combined result is
+rebuilt from the per-file delta states (<name>.state.pkl), so no input is
+cleaned twice.
+
+An input is skipped when its output is up to date: same size and
+modification time as when it was last cleaned, same cleaning rules and same
+output format (recorded in batch_manifest.json). --force reprocesses all.
+"""
+
+import argparse
+import glob
+import gzip
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing
+
+import cleaner_core
+import main
+
+MANIFEST_NAME = "batch_manifest.json"
+COMBINED_NAME = "combined"
+INPUT_SUFFIXES = tuple(ext for exts in cleaner_core.INPUT_EXTENSIONS.values() for ext in exts)
+
+
+def find_inputs(patterns):
+    """Input files for directories (their dumps, non-recursive) and globs, sorted and de-duplicated."""
+    found = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            candidates = [os.path.join(pattern, name) for name in os.listdir(pattern)]
+        else:
+            candidates = glob.glob(pattern, recursive=True)
+        for path in candidates:
+            name = path.lower().removesuffix(".gz")
+            if os.path.isfile(path) and name.endswith(INPUT_SUFFIXES):
+                found.add(os.path.abspath(path))
+    return sorted(found)
+
+
+def base_name(path):
+    """ "dumps/run1.xlsx.gz" → "run1"."""
+    name = os.path.basename(path)
+    name = name[:-3] if name.lower().endswith(".gz") else name
+    return os.path.splitext(name)[0]
+
+
+def signature(path, output):
+    """What an up-to-date output was built from."""
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "rules": main.rules_version(),
+            "state": main.STATE_VERSION, "output": output}
+
+
+def load_manifest(directory):
+    """{"files": {input path: entry}, "combined": key of the last combined build}."""
+    try:
+        with open(os.path.join(directory, MANIFEST_NAME), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"files": {}, "combined": None}
+
+
+def save_manifest(directory, manifest):
+    path = os.path.join(directory, MANIFEST_NAME)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+def clean_file(path, output_path, state_path, output, engine, reader, writer):
+    """
+    Cleans one dump (in a pool process). Outputs are written under temporary
+    names and moved into place only on success. Returns stats, timings and counts.
+    """
+    timer = main.StageTimer()
+    decompressed = None
+    input_path = path
+    opener = gzip.open if path.lower().endswith(".gz") else open
+    with opener(path, "rb") as f:
+        input_format = cleaner_core.detect_input_format(path, f.read(8))
+    if opener is gzip.open:
+        # The temporary copy keeps the real extension (openpyxl refuses unknown ones)
+        with gzip.open(path, "rb") as src, tempfile.NamedTemporaryFile(suffix="." + input_format, delete=False) as dst:
+            shutil.copyfileobj(src, dst, main.UPLOAD_CHUNK_SIZE)
+        decompressed = input_path = dst.name
+    try:
+        # A file object, so the writer does not go by the temporary name's extension
+        with open(output_path + ".tmp", "wb") as target:
+            stats = main.run_pipeline(input_path, input_format, target, engine, reader, writer, output,
+                                      timer=timer, state_path=state_path + ".tmp")
+        os.replace(state_path + ".tmp", state_path)
+        os.replace(output_path + ".tmp", output_path)
+    finally:
+        for leftover in (decompressed, output_path + ".tmp", state_path + ".tmp"):
+            if leftover and os.path.exists(leftover):
+                os.remove(leftover)
+    return {"stats": stats, "timings": timer.snapshot(), "counts": main.run_counts(timer)}
+
+
+def build_combined(state_paths, output_path, output, writer):
+    """Builds one result from several per-file states, in the given order."""
+    tables = [main.load_state(path) for path in state_paths]
+    frames = []
+    for parts in zip(*tables):
+        pieces = [part.drop(columns=main.DELTA_COLUMNS) for part in parts if not part.empty]
+        frames.append(main.concat_tables(pieces) if pieces else parts[0].drop(columns=main.DELTA_COLUMNS))
+    sheets, summary_data = main.build_sheets(*frames)
+    with open(output_path + ".tmp", "wb") as target:
+        main.write_output(sheets, target, output, writer)
+    os.replace(output_path + ".tmp", output_path)
+    return summary_data
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Clean directories or globs of scraper dumps in parallel.")
+    parser.add_argument("inputs", nargs="+", help="Directories, files or glob patterns (quote globs; ** recurses)")
+    parser.add_argument("-o", "--output-dir", required=True)
+    parser.add_argument("--output", default=main.DEFAULT_OUTPUT_FORMAT, choices=list(main.OUTPUT_FORMATS))
+    parser.add_argument("--engine", default=main.DEFAULT_ENGINE, choices=list(main.ENGINES))
+    parser.add_argument("--reader", default=main.DEFAULT_READER, choices=main.READERS)
+    parser.add_argument("--writer", default=main.DEFAULT_WRITER, choices=list(main.WRITERS))
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="Files cleaned at once (default: CPU count)")
+    parser.add_argument("--no-combined", action="store_true", help="Only write the per-file outputs")
+    parser.add_argument("--force", action="store_true", help="Reprocess inputs even when up to date")
+    args = parser.parse_args()
+
+    inputs = find_inputs(args.inputs)
+    if not inputs:
+        sys.exit("No input files found")
+    names = [base_name(path) for path in inputs]
+    duplicates = sorted({name for name in names if names.count(name) > 1} | ({COMBINED_NAME} & set(names)))
+    if duplicates:
+        sys.exit(f"Inputs would share output names: {', '.join(duplicates)}")
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    ext = main.OUTPUT_FORMATS[args.output][0]
+    manifest = load_manifest(args.output_dir)
+    outputs = {path: os.path.join(args.output_dir, f"{name}.cleaned.{ext}") for path, name in zip(inputs, names)}
+    states = {path: os.path.join(args.output_dir, f"{name}.state.pkl") for path, name in zip(inputs, names)}
+
+    def up_to_date(path):
+        entry = manifest["files"].get(path)
+        return (entry is not None and entry["signature"] == signature(path, args.output)
+                and os.path.exists(outputs[path]) and os.path.exists(states[path]))
+
+    todo = inputs if args.force else [path for path in inputs if not up_to_date(path)]
+    skipped = len(inputs) - len(todo)
+    jobs = max(1, min(args.jobs, len(todo)))
+    failed, rows, emails, valid = [], 0, 0, 0
+    start = time.perf_counter()
+
+    if todo:
+        with ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context("spawn")) as pool:
+            futures = {
+                pool.submit(clean_file, path, outputs[path], states[path], args.output,
+                            args.engine, args.reader, args.writer): path
+                for path in todo
+            }
+            for done, future in enumerate(as_completed(futures), 1):
+                path = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    failed.append(path)
+                    manifest["files"].pop(path, None)
+                    print(f"[{done}/{len(todo)}] {path}  FAILED: {e}", file=sys.stderr)
+                    continue
+                counts = result["counts"]
+                rows, emails, valid = rows + counts["rows"], emails + counts["emails"], valid + counts["valid_emails"]
+                manifest["files"][path] = {"signature": signature(path, args.output), "output": outputs[path],
+                                  "stats": result["stats"], "counts": counts}
+                print(f"[{done}/{len(todo)}] {path}  {counts['rows']:,} rows  "
+                      f"{sum(result['timings'].values()):.1f}s  → {outputs[path]}")
+        save_manifest(args.output_dir, manifest)
+    clean_seconds = time.perf_counter() - start
+
+    combined_path = None
+    if not args.no_combined:
+        combined_path = os.path.join(args.output_dir, f"{COMBINED_NAME}.cleaned.{ext}")
+        cleaned = [path for path in inputs if path not in failed]
+        combined_key = [manifest["files"][path]["signature"] | {"path": path} for path in cleaned]
+        if cleaned and (manifest["combined"] != combined_key or not os.path.exists(combined_path)):
+            build_combined([states[path] for path in cleaned], combined_path, args.output, args.writer)
+            manifest["combined"] = combined_key
+            save_manifest(args.output_dir, manifest)
+
+    total_seconds = time.perf_counter() - start
+    print()
+    print(f"{len(todo) - len(failed)} cleaned, {skipped} up to date, {len(failed)} failed "
+          f"in {total_seconds:.1f}s ({jobs} processes)")
+    if todo:
+        print(f"{rows:,} rows, {emails:,} emails ({valid:,} valid) — "
+              f"{rows / clean_seconds:,.0f} rows/s, {len(todo) / clean_seconds:.2f} files/s")
+    if combined_path and os.path.exists(combined_path):
+        print(f"Combined: {combined_path}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main_cli()
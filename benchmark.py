@@ -0,0 +1,296 @@
+"""
+Benchmark suite — helper throughput and end-to-end /process-excel/ runs on
+synthetic dumps (see generate_dump.py), checked against stored baselines.
+
+    python benchmark.py                              # helpers + end-to-end at 10k and 100k rows
+    python benchmark.py --sizes 10000 100000 1000000 --engine columnar --reader stream
+    python benchmark.py --only helpers
+    python benchmark.py --only startup               # cold start: import + first request
+    python benchmark.py --update-baselines           # record this machine's numbers
+
+Each end-to-end size runs in a fresh child process so its peak memory
+(ru_maxrss) is measured on its own. Persistent stores (result cache, verdict
+store, delta state, suppression index) are disabled there so every run does
+the full work.
+
+Startup cases measure a cold start per engine in a fresh interpreter:
+`import main`, then the first /process-excel/ request on a small CSV.
+
+A result regresses when its throughput falls more than `tolerance` below
+the baseline, or its peak memory or startup time rises more than
+`tolerance` above it.
+The exit status is 1 if anything regressed.
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from generate_dump import iter_rows, write_dump
+
+BASELINES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baselines.json")
+DEFAULT_TOLERANCE = 0.30
+DEFAULT_SIZES = [10_000, 100_000]
+HELPER_SAMPLE_ROWS = 20_000
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def dump_path(rows, fmt, seed=0):
+    """A synthetic dump of `rows` rows, generated once and reused."""
+    path = os.path.join(tempfile.gettempdir(), f"email_cleaner_bench_{rows}_{seed}.{fmt}")
+    if not os.path.exists(path):
+        write_dump(path, iter_rows(rows, seed=seed))
+    return path
+
+
+# ======================
+# HELPERS
+# ======================
+
+def helper_cases():
+    """(name, function, argument tuples) for each helper, on generated data."""
+    import cleaner_core as core
+
+    names, emails, row_emails = [], [], []
+    for name, all_emails, _, _ in iter_rows(HELPER_SAMPLE_ROWS, seed=1):
+        names.append(name)
+        row_emails.append([e.strip() for e in (all_emails or "").split(",")])
+        emails.extend(row_emails[-1])
+    valid = [e for e in emails if core.EMAIL_REGEX.match(e) and not core.is_junk_email(e)]
+    domains = [e.split("@")[1] for e in valid]
+    cleaned = [core.clean_name(n) for n in names]
+    pairs = list(zip(cleaned, valid))
+    # One call per researcher: the row's name against all of its emails
+    batches = list(zip(cleaned, row_emails))
+
+    return [
+        ("clean_name",                      core.clean_name,                      [(n,) for n in names]),
+        ("is_missing_name",                 core.is_missing_name,                 [(n,) for n in cleaned]),
+        ("EMAIL_REGEX",                     core.EMAIL_REGEX.match,               [(e,) for e in emails]),
+        ("is_junk_email",                   core.is_junk_email,                   [(e,) for e in emails]),
+        ("get_country",                     core.get_country,                     [(d,) for d in domains]),
+        ("extract_name_from_email",         core.extract_name_from_email,         [(e,) for e in valid]),
+        ("extract_name_from_email_relaxed", core.extract_name_from_email_relaxed, [(e,) for e in valid]),
+        ("is_name_similar_to_email",        core.is_name_similar_to_email,        pairs),
+        ("name_similarity_scores",          core.name_similarity_scores,          batches),
+    ]
+
+
+# Each timing repeats the sample for at least this long; the best of HELPER_REPEATS counts
+HELPER_MIN_SECONDS = 0.25
+HELPER_REPEATS = 5
+
+
+def bench_helpers():
+    results = {}
+    for name, func, calls in helper_cases():
+        best = 0.0
+        for _ in range(HELPER_REPEATS):
+            done, start = 0, time.perf_counter()
+            while time.perf_counter() - start < HELPER_MIN_SECONDS:
+                for args in calls:
+                    func(*args)
+                done += len(calls)
+            best = max(best, done / (time.perf_counter() - start))
+        results[f"helper:{name}"] = {"calls_per_sec": round(best)}
+    return results
+
+
+# ======================
+# END TO END
+# ======================
+
+def run_child(rows, fmt, engine, reader, writer, workers):
+    """Runs one end-to-end case in this process; prints its metrics as JSON."""
+    os.environ["RESULT_CACHE"] = "0"
+    os.environ["VERDICT_STORE"] = "0"
+    os.environ["DELTA_STATE"] = "0"
+    os.environ["SUPPRESSION_INDEX"] = "0"
+    from fastapi.testclient import TestClient
+    import main
+
+    path = dump_path(rows, fmt)
+    client = TestClient(main.app)
+    query = f"?engine={engine}&reader={reader}&writer={writer}&workers={workers}&cache=false"
+    # A small warm-up run pays for the imports main defers to first use (see STARTUP)
+    with open(dump_path(STARTUP_ROWS, fmt), "rb") as f:
+        client.post("/process-excel/" + query, files={"file": (os.path.basename(path), f)}).raise_for_status()
+    start = time.perf_counter()
+    with open(path, "rb") as f:
+        response = client.post("/process-excel/" + query, files={"file": (os.path.basename(path), f)})
+    seconds = time.perf_counter() - start
+    response.raise_for_status()
+    print(json.dumps({
+        "seconds":      round(seconds, 3),
+        "rows_per_sec": round(rows / seconds),
+        "peak_rss_mb":  round(peak_rss_mb(), 1),
+    }))
+
+
+def bench_end_to_end(sizes, fmt, engine, reader, writer, workers):
+    results = {}
+    for rows in sizes:
+        dump_path(rows, fmt)  # generate outside the measured child
+        child = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", str(rows), "--format", fmt,
+             "--engine", engine, "--reader", reader, "--writer", writer, "--workers", str(workers)],
+            capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+        )
+        if child.returncode != 0:
+            raise RuntimeError(f"{rows} rows failed:\n{child.stderr}")
+        key = f"e2e:{rows}:{fmt}:{engine}:{reader}:{writer}:{workers}"
+        results[key] = json.loads(child.stdout.strip().splitlines()[-1])
+    return results
+
+
+# ======================
+# STARTUP
+# ======================
+
+STARTUP_ROWS = 1_000
+STARTUP_ENGINES = ["core", "rows"]
+# Cold starts are noisy; the best of this many fresh processes counts
+STARTUP_REPEATS = 3
+
+
+def run_startup_child(engine):
+    """Times `import main` and the first request in this (fresh) process; prints JSON."""
+    os.environ["RESULT_CACHE"] = "0"
+    os.environ["VERDICT_STORE"] = "0"
+    os.environ["DELTA_STATE"] = "0"
+    os.environ["SUPPRESSION_INDEX"] = "0"
+    start = time.perf_counter()
+    import main
+    imported = time.perf_counter()
+    from fastapi.testclient import TestClient
+
+    path = dump_path(STARTUP_ROWS, "csv")
+    client = TestClient(main.app)
+    request_start = time.perf_counter()
+    with open(path, "rb") as f:
+        response = client.post(f"/process-excel/?engine={engine}&download=true&cache=false",
+                               files={"file": (os.path.basename(path), f)})
+    done = time.perf_counter()
+    response.raise_for_status()
+    print(json.dumps({
+        "import_ms":        round((imported - start) * 1000),
+        "first_request_ms": round((done - request_start) * 1000),
+        "peak_rss_mb":      round(peak_rss_mb(), 1),
+    }))
+
+
+def bench_startup(engines):
+    results = {}
+    dump_path(STARTUP_ROWS, "csv")
+    for engine in engines:
+        runs = []
+        for _ in range(STARTUP_REPEATS):
+            child = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--startup-child", engine],
+                capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+            )
+            if child.returncode != 0:
+                raise RuntimeError(f"startup with engine={engine} failed:\n{child.stderr}")
+            runs.append(json.loads(child.stdout.strip().splitlines()[-1]))
+        results[f"startup:{engine}"] = {metric: min(run[metric] for run in runs) for metric in runs[0]}
+    return results
+
+
+# ======================
+# BASELINES
+# ======================
+
+# metric → True when higher is better
+METRICS = {
+    "calls_per_sec": True, "rows_per_sec": True, "peak_rss_mb": False,
+    "import_ms": False, "first_request_ms": False,
+}
+
+
+def load_baselines():
+    if not os.path.exists(BASELINES_PATH):
+        return {"tolerance": DEFAULT_TOLERANCE, "results": {}}
+    with open(BASELINES_PATH, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare(results, baselines, tolerance):
+    """Prints each result against its baseline; returns the list of regressions."""
+    regressions = []
+    for key, metrics in results.items():
+        baseline = baselines["results"].get(key, {})
+        for metric, value in metrics.items():
+            if metric not in METRICS:
+                continue
+            expected = baseline.get(metric)
+            status = "new"
+            if expected:
+                higher_is_better = METRICS[metric]
+                change = (value - expected) / expected
+                regressed = change < -tolerance if higher_is_better else change > tolerance
+                status = f"{change:+.0%}" + ("  REGRESSION" if regressed else "")
+                if regressed:
+                    regressions.append((key, metric, value, expected))
+            print(f"{key:<55} {metric:<14} {value:>12,}   baseline {expected or '-':>12}   {status}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the email cleaner.")
+    parser.add_argument("--only", choices=["helpers", "e2e", "startup"])
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--format", default="xlsx", choices=["xlsx", "csv", "parquet", "jsonl"])
+    parser.add_argument("--engine", default="rows")
+    parser.add_argument("--reader", default="pandas")
+    parser.add_argument("--writer", default="pandas")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--tolerance", type=float, default=None,
+                        help="Allowed relative slowdown / memory growth (default: from the baselines file)")
+    parser.add_argument("--update-baselines", action="store_true")
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--startup-child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.format, args.engine, args.reader, args.writer, args.workers)
+        return
+    if args.startup_child:
+        run_startup_child(args.startup_child)
+        return
+
+    results = {}
+    if args.only in (None, "helpers"):
+        results.update(bench_helpers())
+    if args.only in (None, "e2e"):
+        results.update(bench_end_to_end(args.sizes, args.format, args.engine, args.reader,
+                                        args.writer, args.workers))
+    if args.only in (None, "startup"):
+        results.update(bench_startup(STARTUP_ENGINES))
+
+    baselines = load_baselines()
+    tolerance = args.tolerance if args.tolerance is not None else baselines.get("tolerance", DEFAULT_TOLERANCE)
+    regressions = compare(results, baselines, tolerance)
+
+    if args.update_baselines:
+        baselines["results"].update(results)
+        with open(BASELINES_PATH, "w", encoding="utf-8") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Baselines written to {BASELINES_PATH}")
+    elif regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {tolerance:.0%}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,794 @@
+"""
+The cleaning rules and a pandas-free pipeline.
+
+Everything the cleaner decides about a name or an address lives here: the
+email regex, junk rules, country lookup and name extraction. main.py builds
+its pandas engines on these helpers.
+
+The rest of the module runs the whole /process-excel/ pipeline on plain
+Python rows (stdlib csv/json, openpyxl for workbooks), producing the same
+six sheets as main.build_sheets. It backs engine=core, which never imports
+pandas or numpy — the cheap path for serverless cold starts.
+"""
+
+import collections
+import contextlib
+import csv
+import functools
+import io
+import json
+import os
+import re
+import unicodedata
+import zipfile
+
+# ======================
+# RULES
+# ======================
+
+# Requires: local part ≥2 chars, domain has at least one dot with a 2–6 letter TLD
+EMAIL_REGEX = re.compile(r"^[\w\.-]{2,}@[\w\.-]+\.[a-zA-Z]{2,6}$")
+
+# Values treated as "no name" after whitespace normalisation and lowercasing
+MISSING_NAME_VALUES = ["", "nan", "none", "null", "unknown", "-", "na", "n/a", "not available"]
+
+# Zero-width / separator characters stripped from scraped names
+INVISIBLE_CHARS_REGEX = re.compile(r'[\u00a0\u200b\u200c\u200d\ufeff\u2028\u2029]')
+
+def is_missing_value(value):
+    """None, NaN or pandas' NA/NaT — what pd.isna reports for a single value."""
+    if value is None:
+        return True
+    try:
+        return bool(value != value)
+    except TypeError:  # pd.NA compares to NA, whose truth value is ambiguous
+        return True
+
+def clean_name(value):
+    if is_missing_value(value):
+        return ""
+    cleaned = " ".join(str(value).split()).strip()
+    cleaned = INVISIBLE_CHARS_REGEX.sub('', cleaned)
+    return cleaned
+
+def is_missing_name(name):
+    name = " ".join(name.split()).strip().lower()
+    return name in MISSING_NAME_VALUES
+
+# Block Words (Instructions / Sentences / Common Placeholders) — rejected anywhere in the username
+JUNK_BLOCK_WORDS = [
+    "correspondence", "pleasesend", "workconducted", "workdone",
+    "writtenwhile", "interning", "currentaddress", "author",
+    "reprint", "address", "published", "submitted", "preprint",
+    "firstname", "lastname", "surname", "secondname",
+    "yourname", "username", "user.name", "example",
+    "email", "contact", "domain", "here", "report",
+    # Hyphenated/dot-separated placeholder patterns
+    "first-name", "last-name", "first.last", "first.name", "last.name",
+    # Generic role/action words that appear as usernames
+    "working", "postdoc", "professor", "researcher",
+]
+
+# Single-token generic words used as name placeholders
+JUNK_PLACEHOLDER_TOKENS = ["working", "name", "user"]
+
+# Usernames starting with a domain (common scraping error)
+JUNK_DOMAIN_PREFIXES = ["gmail.com", "yahoo.com", "hotmail.com"]
+
+# Sentences often > 50 chars
+MAX_LOCAL_PART_LENGTH = 50
+
+def _compile_junk_matcher():
+    """
+    Compiles every username rule into one regex anchored at the start of the
+    username. Each alternative is a lookahead followed by an empty named group,
+    so a single match() returns the first rule that fires (in the order below)
+    via match.lastgroup.
+    """
+    def any_of(words):
+        return "(?:" + "|".join(re.escape(w) for w in words) + ")"
+
+    sep = r"[.\-_+]"
+    token = lambda w: rf"(?:.*{sep})?{w}(?:{sep}|\Z)"
+    rules = [
+        # 1. Block words anywhere in the username
+        ("block_word",        rf"(?=.*?{any_of(JUNK_BLOCK_WORDS)})"),
+        # 2. Both 'first' and 'last' as separator-delimited tokens (first.last@, first-last@)
+        ("first_last_tokens", rf"(?={token('first')})(?={token('last')})"),
+        # 2b. The whole username is a generic placeholder word
+        ("placeholder_token", rf"(?={any_of(JUNK_PLACEHOLDER_TOKENS)}\Z)"),
+        # 3. Specific Starts/Ends checks for "name"
+        ("name_affix",        r"(?=name\.|.*\.name\Z|.*?\.name\.)"),
+        # 4. Starting with domain patterns
+        ("domain_prefix",     rf"(?={any_of(JUNK_DOMAIN_PREFIXES)})"),
+        # 5. Length heuristic
+        ("too_long",          rf"(?=.{{{MAX_LOCAL_PART_LENGTH + 1}}})"),
+    ]
+    return re.compile("|".join(f"{pattern}(?P<{name}>)" for name, pattern in rules), re.DOTALL)
+
+JUNK_MATCHER = _compile_junk_matcher()
+
+def junk_reason(email):
+    """
+    Returns the name of the first junk rule the email trips, or None if it is clean.
+    Rules: empty, malformed, short_local, no_dot_domain, block_word,
+    first_last_tokens, placeholder_token, name_affix, domain_prefix, too_long.
+    """
+    if not email:
+        return "empty"
+
+    parts = email.split("@")
+    if len(parts) != 2:
+        return "malformed"
+
+    local_part = parts[0].lower()
+
+    # 0. Reject single-character local parts (e.g. 'n@esintoaunitball' OCR artifacts)
+    if len(local_part) <= 1:
+        return "short_local"
+
+    # 0b. Reject domains with no dot — real domains always have a TLD separated by a dot
+    if "." not in parts[1]:
+        return "no_dot_domain"
+
+    # 1-5. Username rules, evaluated in a single scan
+    match = JUNK_MATCHER.match(local_part)
+    return match.lastgroup if match else None
+
+def is_junk_email(email):
+    """
+    Filters out garbage emails containing sentences, placeholders, or instruction text.
+    Also rejects OCR artifacts where a letter in a word was mistaken for '@'.
+    Returns True if email is considered junk.
+    """
+    return junk_reason(email) is not None
+
+# Country suffix table. Compound suffixes (e.g. .ac.uk) win over shorter ones (.uk).
+TLD_MAP = {
+    ".ac.uk": "United Kingdom", ".co.uk": "United Kingdom", ".uk": "United Kingdom",
+    ".edu.au": "Australia", ".com.au": "Australia", ".net.au": "Australia", ".au": "Australia",
+    ".edu.cn": "China", ".com.cn": "China", ".cn": "China",
+    ".edu.hk": "Hong Kong", ".hk": "Hong Kong",
+    ".edu.tw": "Taiwan", ".tw": "Taiwan",
+    ".de": "Germany",
+    ".fr": "France",
+    ".edu": "USA (Academic)",
+    ".jp": "Japan", ".ac.jp": "Japan",
+    ".kr": "South Korea", ".ac.kr": "South Korea",
+    ".ca": "Canada",
+    ".in": "India", ".ac.in": "India", ".co.in": "India",
+    ".sg": "Singapore", ".com.sg": "Singapore",
+    ".it": "Italy",
+    ".es": "Spain",
+    ".nl": "Netherlands",
+    ".ru": "Russia",
+    ".br": "Brazil",
+    ".pk": "Pakistan",
+    ".se": "Sweden",
+    ".no": "Norway",
+    ".dk": "Denmark",
+    ".fi": "Finland",
+    ".pl": "Poland",
+    ".ch": "Switzerland",
+    ".at": "Austria",
+    ".be": "Belgium",
+    ".cz": "Czech Republic",
+    ".tr": "Turkey",
+    ".gr": "Greece",
+    ".il": "Israel", ".ac.il": "Israel",
+    ".za": "South Africa", ".ac.za": "South Africa",
+    ".mx": "Mexico",
+    ".ar": "Argentina",
+    ".cl": "Chile",
+    ".co": "Colombia",
+    ".my": "Malaysia",
+    ".id": "Indonesia",
+    ".th": "Thailand",
+    ".vn": "Vietnam",
+    ".ph": "Philippines",
+    ".nz": "New Zealand",
+    ".ie": "Ireland",
+    ".pt": "Portugal",
+    ".hu": "Hungary",
+    ".ro": "Romania",
+    ".ua": "Ukraine",
+    ".ir": "Iran",
+    ".eg": "Egypt",
+    ".sa": "Saudi Arabia",
+    ".ae": "UAE",
+}
+
+DEFAULT_COUNTRY = "Other/Global"
+
+# Every suffix registered so far (TLD_MAP plus any loaded table)
+SUFFIX_TABLE = {}
+
+# Reversed-label trie built once at import: {"uk": {"ac": {...}, None: "United Kingdom"}}.
+# The None key holds the country for the suffix ending at that node.
+_SUFFIX_TRIE = {}
+
+def register_suffixes(mapping):
+    """
+    Adds suffix → country entries to the resolver. Suffixes may be given with or
+    without the leading dot. Lookup cost depends only on the number of labels in
+    the domain, not on the size of the table.
+    """
+    SUFFIX_TABLE.update(mapping)
+    for suffix, country in mapping.items():
+        labels = suffix.lower().strip().lstrip("*").strip(".").split(".")
+        node = _SUFFIX_TRIE
+        for label in reversed(labels):
+            node = node.setdefault(label, {})
+        node[None] = country
+
+def load_suffix_table(path):
+    """
+    Loads a public-suffix style table with one `suffix,Country` (or tab-separated)
+    entry per line. Blank lines and lines starting with '#' or '//' are ignored.
+    """
+    mapping = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#") or line.startswith("//"):
+                continue
+            sep = "\t" if "\t" in line else ","
+            suffix, _, country = line.partition(sep)
+            if suffix.strip() and country.strip():
+                mapping[suffix.strip()] = country.strip()
+    register_suffixes(mapping)
+    return len(mapping)
+
+register_suffixes(TLD_MAP)
+if os.getenv("COUNTRY_SUFFIX_FILE"):
+    load_suffix_table(os.getenv("COUNTRY_SUFFIX_FILE"))
+
+def get_country(domain):
+    labels = domain.lower().split(".")
+    node = _SUFFIX_TRIE
+    country = DEFAULT_COUNTRY
+    # Walk from the TLD inwards; the suffix must be preceded by at least one label
+    for depth in range(len(labels) - 1, 0, -1):
+        node = node.get(labels[depth])
+        if node is None:
+            break
+        country = node.get(None, country)
+    return country
+
+def get_countries(domains):
+    """
+    Bulk variant of get_country — resolves each distinct domain once and
+    returns a list aligned with the input.
+    """
+    resolved = {}
+    countries = []
+    for domain in domains:
+        country = resolved.get(domain)
+        if country is None:
+            country = resolved[domain] = get_country(domain)
+        countries.append(country)
+    return countries
+
+# Username parts that are never treated as name words
+NAME_STOPWORDS = {
+    "admin", "info", "support", "contact", "mail", "email",
+    "noreply", "no-reply", "help", "team", "office", "phd",
+    "lab", "dept", "university", "research", "group", "center",
+    "cs", "eng", "sci", "edu", "web", "service", "services",
+    # Placeholder / generic words
+    "first", "last", "name", "working", "user", "postdoc",
+}
+
+def extract_name_from_email(email):
+    """
+    Strict name extraction — requires at least 2 valid word parts.
+    e.g. john.smith@x.com → John Smith
+         guohao@x.com     → (empty, single token)
+    """
+    try:
+        username = email.split("@")[0].lower()
+        parts = re.split(r'[.\-_+]', username)
+        valid_parts = []
+        for part in parts:
+            if not part:
+                continue
+            if part.isdigit():
+                continue
+            if any(c.isdigit() for c in part):
+                continue
+            if len(part) <= 2:
+                continue
+            if part in NAME_STOPWORDS:
+                continue
+            valid_parts.append(part.capitalize())
+        if len(valid_parts) < 2:
+            return ""
+        return " ".join(valid_parts)
+    except Exception:
+        return ""
+
+
+def extract_name_from_email_relaxed(email):
+    """
+    Relaxed name extraction — accepts a single valid word as a name.
+    Used for Sheet 4 on emails that already failed the strict check.
+    e.g. guohao@x.com  → Guohao
+         errolf@x.com  → Errolf
+         cchen151@x.com → (empty, contains digits)
+         admin@x.com   → (empty, stopword)
+    """
+    try:
+        username = email.split("@")[0].lower()
+        parts = re.split(r'[.\-_+]', username)
+        valid_parts = []
+        for part in parts:
+            if not part:
+                continue
+            if part.isdigit():
+                continue
+            if any(c.isdigit() for c in part):
+                continue
+            if len(part) <= 2:
+                continue
+            if part in NAME_STOPWORDS:
+                continue
+            valid_parts.append(part.capitalize())
+        # Relaxed: accept even a single valid word
+        if len(valid_parts) < 1:
+            return ""
+        return " ".join(valid_parts)
+    except Exception:
+        return ""
+
+
+# Name letters addresses spell in ASCII. NFKD strips accents (é → e); these
+# tables cover letters it leaves alone, dropped to their base letter or
+# spelled out the way authors usually do in addresses (Søgaard → soegaard).
+FOLDED_LETTERS = {"ø": "o", "æ": "ae", "œ": "oe", "ß": "ss", "đ": "d", "ð": "d", "þ": "th", "ł": "l", "ı": "i"}
+TRANSLITERATIONS = {"ø": "oe", "å": "aa", "ä": "ae", "ö": "oe", "ü": "ue"}
+
+def _ascii_fold(text, letters):
+    text = "".join(letters.get(c, c) for c in text)
+    return "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+
+@functools.lru_cache(maxsize=65536)
+def name_profile(name):
+    """
+    A name's matchable tokens (more than 2 characters), each as a tuple of
+    spellings — as written, accent-folded, transliterated — longest first.
+    Computed once per distinct name.
+    """
+    if is_missing_name(name):
+        return ()
+    tokens = [t for t in re.sub(r'[^\w\s]', ' ', name.lower()).split() if len(t) > 2]
+    profile = []
+    for token in tokens:
+        spellings = {token, _ascii_fold(token, FOLDED_LETTERS),
+                     _ascii_fold(token, {**FOLDED_LETTERS, **TRANSLITERATIONS})}
+        profile.append(tuple(sorted((s for s in spellings if len(s) > 2), key=len, reverse=True)))
+    return tuple(profile)
+
+def _similarity(profile, local_part):
+    matched = covered = 0
+    for spellings in profile:
+        for spelling in spellings:
+            if spelling in local_part:
+                matched += 1
+                covered += len(spelling)
+                break
+    if not matched:
+        return 0.0
+    letters = max(1, sum(c.isalnum() for c in local_part))
+    return round((matched / len(profile) + min(1.0, covered / letters)) / 2, 4)
+
+def name_similarity_scores(name, emails):
+    """
+    Scores each email's local part against one name, from 0 (no name token
+    in it) to 1 (every token present and nothing else): the mean of the share
+    of tokens found and the share of the local part they cover.
+    e.g. Anders Søgaard → anders.soegaard 1.0, soegaard 0.75, asoegaard 0.69
+    """
+    profile = name_profile(name)
+    if not profile:
+        return [0.0] * len(emails)
+    return [_similarity(profile, email.split("@")[0].lower()) if email else 0.0 for email in emails]
+
+def score_name_email_pairs(names, emails):
+    """name_similarity_scores for aligned names and emails, one batch per distinct name."""
+    by_name = {}
+    for i, name in enumerate(names):
+        by_name.setdefault(name, []).append(i)
+    scores = [0.0] * len(names)
+    for name, positions in by_name.items():
+        for i, score in zip(positions, name_similarity_scores(name, [emails[i] for i in positions])):
+            scores[i] = score
+    return scores
+
+def is_name_similar_to_email(name, email):
+    """
+    Checks if the given name is likely associated with the given email.
+    """
+    return name_similarity_scores(name, [email])[0] > 0
+
+
+# ======================
+# VERDICTS
+# ======================
+# Everything derived from an address alone.
+
+# reason is the rejection_reason of an invalid email (None for valid ones)
+Verdict = collections.namedtuple("Verdict", ["valid", "domain", "country", "name", "relaxed_name", "reason"])
+
+def rejection_reason(email):
+    """Why the cleaner drops an email ("regex" or a junk_reason rule), or None if it is kept."""
+    if email and EMAIL_REGEX.match(email) is None:
+        return "regex"
+    return junk_reason(email)
+
+def compute_verdict(email):
+    reason = rejection_reason(email)
+    if reason is not None:
+        return Verdict(False, "", "", "", "", reason)
+    domain = email.split("@")[1]
+    return Verdict(True, domain, get_country(domain),
+                   extract_name_from_email(email), extract_name_from_email_relaxed(email), None)
+
+
+# ======================
+# INPUT
+# ======================
+# Rows are (Name, All Emails, Similar Emails, Citations) tuples with cells
+# normalised the way the pandas readers would: NA strings become None and
+# integral floats ints, and Citations gets one type for the whole column.
+
+INPUT_COLUMNS = ["Name", "All Emails", "Similar Emails", "Citations"]
+
+# Cell strings pd.read_excel / pd.read_csv treat as missing by default
+NA_STRINGS = {
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND",
+    "1.#QNAN", "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null",
+}
+
+INPUT_EXTENSIONS = {
+    "xlsx":    (".xlsx", ".xlsm", ".xls"),
+    "csv":     (".csv", ".txt"),
+    "parquet": (".parquet", ".pq"),
+    "jsonl":   (".jsonl", ".ndjson", ".json"),
+}
+
+# Formats the core pipeline reads and writes (Parquet needs pyarrow/pandas)
+CORE_FORMATS = ("xlsx", "csv", "jsonl")
+
+def detect_input_format(filename, head):
+    """
+    Picks the input format from the file's leading bytes, falling back to the
+    upload's extension (ignoring a trailing .gz), then to JSONL/CSV sniffing.
+    """
+    if head.startswith(b"PK\x03\x04") or head.startswith(b"\xd0\xcf\x11\xe0"):
+        return "xlsx"
+    if head.startswith(b"PAR1"):
+        return "parquet"
+
+    name = (filename or "").lower()
+    if name.endswith(".gz"):
+        name = name[:-3]
+    for fmt, extensions in INPUT_EXTENSIONS.items():
+        if name.endswith(extensions):
+            return fmt
+
+    return "jsonl" if head.lstrip().startswith(b"{") else "csv"
+
+def convert_cell(value):
+    """Normalises a cell value the way pd.read_excel does."""
+    if isinstance(value, str) and value in NA_STRINGS:
+        return None
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+def _parse_numbers(values):
+    """
+    CSV Citations cells as ints or floats — or left as strings when any
+    cell is not a number, like pd.read_csv's type inference.
+    """
+    parsed = []
+    for value in values:
+        if value is None:
+            parsed.append(None)
+            continue
+        try:
+            parsed.append(int(value))
+        except ValueError:
+            try:
+                parsed.append(float(value))
+            except ValueError:
+                return values
+    return parsed
+
+def _unify_citations(values):
+    """
+    Gives Citations the type pandas would give the column: ints stay ints
+    only when none is missing or fractional, otherwise every number is a float.
+    """
+    if any(isinstance(v, str) for v in values):
+        return values
+    if all(isinstance(v, int) for v in values):
+        return values
+    return [None if v is None else float(v) for v in values]
+
+def _binary_input(source):
+    """Opens a path for binary reading, or passes an open file object through."""
+    return open(source, "rb") if isinstance(source, str) else contextlib.nullcontext(source)
+
+def _select(header, records, convert):
+    """(Name, All Emails, Similar Emails, Citations) tuples from records aligned with header."""
+    missing = [c for c in INPUT_COLUMNS if c not in header]
+    if missing:
+        raise ValueError(f"Missing required column(s): {', '.join(missing)}")
+    positions = [header.index(c) for c in INPUT_COLUMNS]
+    for record in records:
+        yield tuple(convert(record[i]) if i < len(record) else None for i in positions)
+
+def _iter_xlsx(source):
+    from openpyxl import load_workbook  # only workbooks need it
+
+    wb = load_workbook(source, read_only=True, data_only=True)
+    try:
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        header = list(next(rows, ()))
+        yield from _select(header, _trim_blank_tail(rows), convert_cell)
+    finally:
+        wb.close()
+
+def _trim_blank_tail(rows):
+    """Rows without the trailing empty ones, which pd.read_excel drops (inner ones it keeps)."""
+    blank = []
+    for row in rows:
+        if all(v is None for v in row):
+            blank.append(row)
+            continue
+        yield from blank
+        blank = []
+        yield row
+
+def _iter_csv(source):
+    with _binary_input(source) as f:
+        # utf-8-sig drops the BOM Excel puts before "CSV UTF-8" files
+        text = io.TextIOWrapper(f, encoding="utf-8-sig", newline="")
+        try:
+            # Blank lines are skipped, as pd.read_csv does
+            records = (record for record in csv.reader(text) if record)
+            header = next(records, [])
+            yield from _select(header, records, lambda v: None if v in NA_STRINGS else v)
+        finally:
+            text.detach()
+
+def _iter_jsonl(source):
+    with _binary_input(source) as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                yield tuple(record.get(c) for c in INPUT_COLUMNS)
+
+READERS = {"xlsx": _iter_xlsx, "csv": _iter_csv, "jsonl": _iter_jsonl}
+
+def read_rows(source, fmt):
+    """
+    All rows of one input (path or binary file object), or of several given
+    as parallel lists of sources and formats, in order.
+    Raises ValueError for unsupported formats and missing columns.
+    """
+    sources = list(zip(source, fmt)) if isinstance(source, list) else [(source, fmt)]
+    rows, citations = [], []
+    for one_source, one_fmt in sources:
+        if one_fmt not in READERS:
+            raise ValueError(f"The core engine cannot read {one_fmt} inputs")
+        source_rows = list(READERS[one_fmt](one_source))
+        source_citations = [row[3] for row in source_rows]
+        if one_fmt == "csv":
+            source_citations = _parse_numbers(source_citations)
+        rows.extend(source_rows)
+        citations.extend(source_citations)
+    citations = _unify_citations(citations)
+    return [(*row[:3], c) for row, c in zip(rows, citations)]
+
+
+# ======================
+# ENGINE
+# ======================
+
+COLUMNS = ["Name", "Email", "Domain", "Country", "Citations"]
+NAME, EMAIL, DOMAIN, COUNTRY, CITATIONS = range(len(COLUMNS))
+
+def _split_emails(value):
+    if is_missing_value(value):
+        return []
+    return [e.strip() for e in str(value).split(",")]
+
+def collect_rows(rows, counts=None, verdicts=None):
+    """
+    The three per-email tables (all, similar, extracted) as lists of tuples
+    in COLUMNS order — row for row what main.collect_rows_loop builds.
+    Each distinct email is judged once; verdicts, if given, judges them all
+    up front in one call ({email: Verdict} for an iterable of emails).
+    When counts (a dict) is given it receives "emails" and
+    "rejected.<rule>" totals.
+    """
+    all_rows, similar_rows, extracted_rows = [], [], []
+    judged = {}
+    if verdicts is not None:
+        rows = list(rows)
+        judged = verdicts({email for _, all_emails, _, _ in rows for email in _split_emails(all_emails)})
+
+    for name, all_emails, similar_emails, citations in rows:
+        original_name = clean_name(name)
+        name_missing  = is_missing_name(original_name)
+        similar       = set(_split_emails(similar_emails))
+
+        valid = []
+        for email in _split_emails(all_emails):
+            if email not in judged:
+                judged[email] = compute_verdict(email)
+            verdict = judged[email]
+            if verdict.valid:
+                valid.append((email, verdict))
+            if counts is not None:
+                counts["emails"] = counts.get("emails", 0) + 1
+                if verdict.reason:
+                    counts[f"rejected.{verdict.reason}"] = counts.get(f"rejected.{verdict.reason}", 0) + 1
+
+        first_email = valid[0][0] if valid else None
+        # The row's listed similar emails, scored against its name in one pass
+        listed = [email for email, _ in valid if email in similar]
+        scores = dict(zip(listed, name_similarity_scores(original_name, listed)))
+        for email, verdict in valid:
+            is_similar = email in similar
+            is_extra   = email != first_email
+
+            all_rows.append((original_name if not is_extra else "None",
+                             email, verdict.domain, verdict.country, citations))
+            if is_similar and scores[email] > 0:
+                similar_rows.append((original_name, email, verdict.domain, verdict.country, citations))
+            if (name_missing or is_extra) and not is_similar:
+                extracted_rows.append((verdict.name, email, verdict.domain, verdict.country, citations))
+
+    return all_rows, similar_rows, extracted_rows
+
+
+# ======================
+# SHEETS
+# ======================
+
+SUMMARY_COLUMNS = ["Metric", "Count"]
+
+def _first_per(rows, column):
+    """Rows whose value in column has not been seen in an earlier row."""
+    seen = set()
+    kept = []
+    for row in rows:
+        if row[column] not in seen:
+            seen.add(row[column])
+            kept.append(row)
+    return kept
+
+def best_per_name(rows):
+    """
+    Sheet 2 Deduplication: one email per unique Name — the one scoring best
+    against the name, the highest-cited on ties. Rows keep their order.
+    """
+    scores = score_name_email_pairs([row[NAME] for row in rows], [row[EMAIL] for row in rows])
+    best = {}
+    for i in sorted(range(len(rows)), key=lambda i: scores[i], reverse=True):
+        best.setdefault(rows[i][NAME], i)
+    keep = set(best.values())
+    return [row for i, row in enumerate(rows) if i in keep]
+
+def build_sheets(all_rows, similar_rows, extracted_rows):
+    """
+    Same six sheets and summary as main.build_sheets, on the tuples from
+    collect_rows. Returns (sheets, summary_data); sheets maps each sheet
+    name to (header, rows).
+    """
+    # Email dedup keeps the first occurrence in input order, so it is applied before sorting
+    tables = [_first_per(all_rows, EMAIL), similar_rows, _first_per(extracted_rows, EMAIL)]
+
+    # One stable sort by Citations, highest first, missing counts last
+    master = [(row, source) for source, table in enumerate(tables) for row in table]
+    present = [item for item in master if not is_missing_value(item[0][CITATIONS])]
+    present.sort(key=lambda item: item[0][CITATIONS], reverse=True)
+    master = present + [item for item in master if is_missing_value(item[0][CITATIONS])]
+
+    all_clean      = [row for row, source in master if source == 0]
+    similar_name   = best_per_name([row for row, source in master if source == 1])
+    name_processed = [row for row, source in master if source == 2]
+
+    # Blank-name rows whose email yields a relaxed name
+    blank = [row for row in name_processed if row[NAME] == ""]
+    named_count = len(name_processed) - len(blank)
+    relaxed = {row[EMAIL]: extract_name_from_email_relaxed(row[EMAIL]) for row in blank}
+    email_name = [(relaxed[row[EMAIL]], *row[1:]) for row in blank if relaxed[row[EMAIL]]]
+
+    # Similar_Name_Emails + named Name_Processed_Emails + Email_Name_Extracted,
+    # one row per Email; a Similar_Name_Emails row wins over the others.
+    similar_ids = {id(row) for row in similar_name}
+    similar_emails = {row[EMAIL] for row in similar_name}
+    final_seen = set()
+    final = []
+    for row, source in master:
+        if source == 1 and id(row) in similar_ids:
+            if row[EMAIL] not in final_seen:
+                final_seen.add(row[EMAIL])
+                final.append(row)
+        elif source == 2 and row[EMAIL] not in similar_emails:
+            if row[NAME]:
+                final.append(row)
+            elif relaxed[row[EMAIL]]:
+                final.append((relaxed[row[EMAIL]], *row[1:]))
+
+    summary_data = [
+        {"Metric": "Sheet 2 Total (All Clean)",        "Count": len(all_clean)},
+        {"Metric": "Sheet 3 (Similar Name Emails)",    "Count": len(similar_name)},
+        {"Metric": "Sheet 4 (Name Found)",             "Count": named_count},
+        {"Metric": "Sheet 4 (Name Blank)",             "Count": len(blank)},
+        {"Metric": "Sheet 5 (Email Name Extracted)",   "Count": len(email_name)},
+        {"Metric": "Sheet 6 Final Combined",           "Count": len(final)},
+    ]
+
+    sheets = {
+        "Summary":               (SUMMARY_COLUMNS, [(s["Metric"], s["Count"]) for s in summary_data]),
+        "All_Clean_Emails":      (COLUMNS, all_clean),
+        "Similar_Name_Emails":   (COLUMNS, similar_name),
+        "Name_Processed_Emails": (COLUMNS, name_processed),
+        "Email_Name_Extracted":  (COLUMNS, email_name),
+        "Final_Combined":        (COLUMNS, final),
+    }
+    return sheets, summary_data
+
+
+# ======================
+# OUTPUT
+# ======================
+# Same layouts as main's writers: a workbook, a zip of one CSV per sheet, or
+# JSONL tagged with each row's Sheet. Missing values are empty cells / null.
+
+def _binary_output(output):
+    """Opens a path for binary writing, or passes an open file object through."""
+    return open(output, "wb") if isinstance(output, str) else contextlib.nullcontext(output)
+
+def _cell(value):
+    return None if is_missing_value(value) else value
+
+def write_workbook(sheets, output):
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    for sheet_name, (header, rows) in sheets.items():
+        ws = wb.create_sheet(sheet_name)
+        ws.append(header)
+        for row in rows:
+            ws.append([_cell(v) for v in row])
+    wb.save(output)
+
+def write_csv_zip(sheets, output):
+    with zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED) as zf:
+        for sheet_name, (header, rows) in sheets.items():
+            with zf.open(f"{sheet_name}.csv", "w") as member:
+                with io.TextIOWrapper(member, encoding="utf-8", newline="") as text:
+                    writer = csv.writer(text, lineterminator="\n")
+                    writer.writerow(header)
+                    writer.writerows(["" if _cell(v) is None else v for v in row] for row in rows)
+
+def write_jsonl(sheets, output):
+    with _binary_output(output) as f:
+        for sheet_name, (header, rows) in sheets.items():
+            for row in rows:
+                record = {"Sheet": sheet_name, **{c: _cell(v) for c, v in zip(header, row)}}
+                f.write((json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8"))
+
+WRITERS = {"xlsx": write_workbook, "csv": write_csv_zip, "jsonl": write_jsonl}
+
+def write_output(sheets, output, fmt="xlsx"):
+    """Writes the sheets to a path or binary file object."""
+    if fmt not in WRITERS:
+        raise ValueError(f"The core engine cannot write {fmt} output")
+    WRITERS[fmt](sheets, output)
@@ -0,0 +1,178 @@
+"""
+Synthetic scraper dumps (Name / All Emails / Similar Emails / Citations) for
+benchmarks and manual testing.
+
+    python generate_dump.py 100000 dump.xlsx
+    python generate_dump.py 1000000 dump.csv --emails-per-row 1-5 --junk-ratio 0.2 \
+        --missing-name-ratio 0.3 --domain-mix academic=0.4,country=0.3,freemail=0.3
+
+The output format follows the file extension (.xlsx, .csv, .parquet, .jsonl).
+Rows are generated and written one at a time, so memory stays flat for
+.xlsx/.csv/.jsonl (.parquet is built as one DataFrame).
+"""
+
+import argparse
+import csv
+import json
+import random
+
+from openpyxl import Workbook
+
+COLUMNS = ["Name", "All Emails", "Similar Emails", "Citations"]
+
+FIRST_NAMES = [
+    "john", "jane", "maria", "wei", "li", "anders", "søren", "josé", "guohao", "zhenhua",
+    "priya", "ahmed", "yuki", "olga", "pierre", "fatima", "lucas", "chen", "amir", "sofia",
+]
+LAST_NAMES = [
+    "smith", "doe", "garcia", "müller", "chen", "wang", "sogaard", "feng", "kumar", "tanaka",
+    "novak", "dubois", "hassan", "silva", "rossi", "kim", "nguyen", "cohen", "ivanova", "ng",
+]
+
+# Domain classes for --domain-mix
+DOMAINS = {
+    "academic": ["mit.edu", "stanford.edu", "ox.ac.uk", "cam.ac.uk", "u-tokyo.ac.jp",
+                 "tsinghua.edu.cn", "kaist.ac.kr", "iitb.ac.in", "unimelb.edu.au", "usp.br"],
+    "country":  ["tum.de", "inria.fr", "unibo.it", "ethz.ch", "uva.nl", "mcgill.ca",
+                 "kth.se", "uw.edu.pl", "tau.ac.il", "nus.edu.sg"],
+    "freemail": ["gmail.com", "yahoo.com", "hotmail.com", "outlook.com", "163.com", "qq.com"],
+    "other":    ["google.com", "microsoft.com", "research.ibm.com", "example.io", "lab.org"],
+}
+DEFAULT_DOMAIN_MIX = {"academic": 0.5, "country": 0.25, "freemail": 0.2, "other": 0.05}
+
+# Addresses the junk filter (or EMAIL_REGEX) should reject
+JUNK_EMAILS = [
+    "firstname.lastname@{domain}", "name.surname@{domain}", "correspondence.author@{domain}",
+    "pleasesendcorrespondenceto{first}@{domain}", "gmail.com{first}{n}@gmail.com",
+    "workconductedwhilethefirstauthorwasaninternat{last}lab@{domain}", "user@{domain}",
+    "x@{domain}", "{first}@nodot", "{first}.{last}@@{domain}", "your.name@{domain}",
+]
+
+MISSING_NAMES = ["", None, "unknown", "N/A", "-", "nan"]
+
+
+def parse_range(value):
+    """ "2" → (2, 2), "1-4" → (1, 4)."""
+    low, _, high = value.partition("-")
+    return int(low), int(high or low)
+
+
+def parse_mix(value):
+    """ "academic=0.5,freemail=0.5" → {"academic": 0.5, "freemail": 0.5}."""
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name not in DOMAINS:
+            raise ValueError(f"Unknown domain class '{name}'. Choose from: {', '.join(DOMAINS)}")
+        mix[name] = float(weight)
+    return mix
+
+
+def _local_part(rng, first, last):
+    style = rng.randrange(8)
+    if style == 0:
+        return f"{first}.{last}"
+    if style == 1:
+        return f"{first[0]}{last}"
+    if style == 2:
+        return f"{first}_{last}"
+    if style == 3:
+        return first
+    if style == 4:
+        return last
+    if style == 5:
+        return f"{first[0]}.{last}"
+    if style == 6:
+        return f"{first}-{last}"
+    return f"{first}{last}{rng.randint(1, 99)}"
+
+
+def iter_rows(rows, emails_per_row=(1, 3), junk_ratio=0.1, missing_name_ratio=0.2,
+              similar_ratio=0.5, domain_mix=None, seed=0):
+    """
+    Yields `rows` scraper rows as tuples in COLUMNS order.
+
+    emails_per_row is an inclusive (min, max) range; junk_ratio is the share
+    of emails drawn from JUNK_EMAILS; missing_name_ratio the share of rows
+    with a placeholder Name; similar_ratio the share of genuine emails also
+    listed in Similar Emails; domain_mix weights the DOMAINS classes.
+    """
+    rng = random.Random(seed)
+    mix = domain_mix or DEFAULT_DOMAIN_MIX
+    classes, weights = list(mix), list(mix.values())
+
+    for _ in range(rows):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        if rng.random() < missing_name_ratio:
+            name = rng.choice(MISSING_NAMES)
+        else:
+            name = f"{first.title()} {last.title()}"
+            if rng.random() < 0.05:
+                name = "Dr. " + name
+
+        emails, similar = [], []
+        for _ in range(rng.randint(*emails_per_row)):
+            domain = rng.choice(DOMAINS[rng.choices(classes, weights)[0]])
+            if rng.random() < junk_ratio:
+                emails.append(rng.choice(JUNK_EMAILS).format(
+                    first=first, last=last, domain=domain, n=rng.randint(1, 999)))
+                continue
+            email = f"{_local_part(rng, first, last)}@{domain}"
+            emails.append(email)
+            if rng.random() < similar_ratio:
+                similar.append(email)
+
+        citations = None if rng.random() < 0.02 else int(rng.lognormvariate(3, 1.5))
+        yield (
+            name,
+            ", ".join(emails) or None,
+            ", ".join(similar) or None,
+            citations,
+        )
+
+
+def write_dump(path, rows):
+    """Writes rows (tuples in COLUMNS order) in the format given by path's extension."""
+    if path.endswith(".csv"):
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(COLUMNS)
+            writer.writerows(("" if v is None else v for v in row) for row in rows)
+    elif path.endswith(".jsonl"):
+        with open(path, "w", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps(dict(zip(COLUMNS, row)), ensure_ascii=False) + "\n")
+    elif path.endswith(".parquet"):
+        import pandas as pd
+        pd.DataFrame(list(rows), columns=COLUMNS).to_parquet(path, index=False)
+    else:
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet("Sheet1")
+        ws.append(COLUMNS)
+        for row in rows:
+            ws.append(row)
+        wb.save(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic scraper dump.")
+    parser.add_argument("rows", type=int)
+    parser.add_argument("output", help="Output path (.xlsx, .csv, .parquet or .jsonl)")
+    parser.add_argument("--emails-per-row", type=parse_range, default=(1, 3), help='e.g. "2" or "1-4"')
+    parser.add_argument("--junk-ratio", type=float, default=0.1)
+    parser.add_argument("--missing-name-ratio", type=float, default=0.2)
+    parser.add_argument("--similar-ratio", type=float, default=0.5)
+    parser.add_argument("--domain-mix", type=parse_mix, default=None,
+                        help=f"e.g. academic=0.5,freemail=0.5 (classes: {', '.join(DOMAINS)})")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    write_dump(args.output, iter_rows(
+        args.rows, args.emails_per_row, args.junk_ratio, args.missing_name_ratio,
+        args.similar_ratio, args.domain_mix, args.seed,
+    ))
+    print(f"Wrote {args.rows} rows to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,69 @@
-from fastapi import FastAPI, UploadFile, File
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi import FastAPI, HTTPException, UploadFile, File, Query, Request
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
-import pandas as pd
-import re
+import importlib.util
+import sys
 import os
+import io
+import contextlib
+import codecs
+import csv
+import shutil
+import json
 import uuid
+import time
+import hashlib
+import threading
+import collections
+import heapq
+import itertools
+import functools
+import asyncio
+import multiprocessing
 import tempfile
-from dotenv import load_dotenv
+import zipfile
+import zlib
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional
+from result_cache import ResultCache, link_or_copy
+from verdict_store import VerdictStore
+from suppression import SuppressionIndex
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, Counter, Gauge, Histogram, Registry
+import cleaner_core
+from cleaner_core import (
+    EMAIL_REGEX, MISSING_NAME_VALUES, clean_name, is_missing_name,
+    JUNK_BLOCK_WORDS, JUNK_PLACEHOLDER_TOKENS, JUNK_DOMAIN_PREFIXES, MAX_LOCAL_PART_LENGTH,
+    SUFFIX_TABLE, get_country, NAME_STOPWORDS,
+    FOLDED_LETTERS, TRANSLITERATIONS, name_similarity_scores, score_name_email_pairs,
+    Verdict, compute_verdict,
+    INPUT_COLUMNS, convert_cell, detect_input_format,
+    COLUMNS, _binary_input, _binary_output,
+)
 
-load_dotenv()
+def _lazy_import(name):
+    """
+    Returns the module, deferring its actual import until first attribute
+    access. pandas, numpy and openpyxl take most of a cold start, and
+    engine=core requests never touch them.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    spec.loader = importlib.util.LazyLoader(spec.loader)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+pd = _lazy_import("pandas")
+np = _lazy_import("numpy")
+openpyxl = _lazy_import("openpyxl")
+
+# Deployments set their environment directly; only read a .env file when there is one
+ENV_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".env")
+if os.path.exists(ENV_FILE):
+    from dotenv import load_dotenv
+    load_dotenv(ENV_FILE)
 
 # ======================
 # APP SETUP
@@ -19,424 +74,2366 @@ app = FastAPI()
 UPLOAD_DIR = tempfile.gettempdir()
 # os.makedirs(UPLOAD_DIR, exist_ok=True) # System temp dir always exists
 
-app.mount("/static", StaticFiles(directory="static"), name="static")
+# Uploads are copied to disk in fixed-size chunks and capped at MAX_UPLOAD_MB
+# (measured after gzip decompression, if the upload is gzipped).
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+MAX_UPLOAD_BYTES  = int(os.getenv("MAX_UPLOAD_MB", "500")) * 1024 * 1024
+# In-memory buffers spill to disk above this size
+SPOOL_MAX_BYTES   = int(os.getenv("SPOOL_MAX_MB", "32")) * 1024 * 1024
+# Files accepted in one /process-excel/ request (cleaned together as one dump)
+MAX_UPLOAD_FILES  = int(os.getenv("MAX_UPLOAD_FILES", "20"))
+# Slack for multipart boundaries/headers when checking Content-Length up front
+MULTIPART_OVERHEAD = 64 * 1024
 
-@app.get("/")
-async def read_root():
-    return FileResponse("static/index.html")
-
-# Requires: local part ≥2 chars, domain has at least one dot with a 2–6 letter TLD
-EMAIL_REGEX = re.compile(r"^[\w\.-]{2,}@[\w\.-]+\.[a-zA-Z]{2,6}$")
-
-# ======================
-# HELPERS
-# ======================
-
-def clean_name(value):
-    if pd.isna(value):
-        return ""
-    cleaned = " ".join(str(value).split()).strip()
-    cleaned = re.sub(r'[\u00a0\u200b\u200c\u200d\ufeff\u2028\u2029]', '', cleaned)
-    return cleaned
-
-def is_missing_name(name):
-    name = " ".join(name.split()).strip().lower()
-    return name in ["", "nan", "none", "null", "unknown", "-", "na", "n/a", "not available"]
-
-def is_junk_email(email):
-    """
-    Filters out garbage emails containing sentences, placeholders, or instruction text.
-    Also rejects OCR artifacts where a letter in a word was mistaken for '@'.
-    Returns True if email is considered junk.
-    """
-    if not email:
-        return True
-
-    parts = email.split("@")
-    if len(parts) != 2:
-        return True
-
-    local_part = parts[0].lower()
-    domain_part = parts[1].lower()
-
-    # 0. Reject single-character local parts (e.g. 'n@esintoaunitball' OCR artifacts)
-    if len(local_part) <= 1:
-        return True
-
-    # 0b. Reject domains with no dot — real domains always have a TLD separated by a dot
-    if "." not in domain_part:
-        return True
-    
-    # 1. Block Words (Instructions / Sentences / Common Placeholders)
-    block_words = [
-        "correspondence", "pleasesend", "workconducted", "workdone",
-        "writtenwhile", "interning", "currentaddress", "author",
-        "reprint", "address", "published", "submitted", "preprint",
-        "firstname", "lastname", "surname", "secondname",
-        "yourname", "username", "user.name", "example",
-        "email", "contact", "domain", "here", "report",
-        # Hyphenated/dot-separated placeholder patterns
-        "first-name", "last-name", "first.last", "first.name", "last.name",
-        # Generic role/action words that appear as usernames
-        "working", "postdoc", "professor", "researcher",
-    ]
+class UploadTooLarge(Exception):
+    pass
 
-    if any(word in local_part for word in block_words):
-        return True
-
-    # 2. Token-level placeholder check: split on separators and look for
-    #    both 'first' and 'last' tokens (e.g. first.last@, first-last@)
-    tokens = re.split(r'[.\-_+]', local_part)
-    if "first" in tokens and "last" in tokens:
-        return True
-    # Single-token generic words used as name placeholders
-    if tokens == ["working"] or tokens == ["name"] or tokens == ["user"]:
-        return True
-
-    # 3. Specific Starts/Ends checks for "name"
-    if local_part.startswith("name.") or local_part.endswith(".name") or ".name." in local_part:
-        return True
-
-    # 4. Starting with domain patterns (common scraping error)
-    if local_part.startswith("gmail.com") or local_part.startswith("yahoo.com") or local_part.startswith("hotmail.com"):
-        return True
-
-    # 5. Length Heuristic (Sentences often > 50 chars)
-    if len(local_part) > 50:
-        return True
-
-    return False
-
-def get_country(domain):
-    domain = domain.lower()
-    # Ordered by length to match specific subdomains first (e.g. .co.uk before .uk)
-    tld_map = {
-        ".ac.uk": "United Kingdom", ".co.uk": "United Kingdom", ".uk": "United Kingdom",
-        ".edu.au": "Australia", ".com.au": "Australia", ".net.au": "Australia", ".au": "Australia",
-        ".edu.cn": "China", ".com.cn": "China", ".cn": "China",
-        ".edu.hk": "Hong Kong", ".hk": "Hong Kong",
-        ".edu.tw": "Taiwan", ".tw": "Taiwan",
-        ".de": "Germany",
-        ".fr": "France",
-        ".edu": "USA (Academic)",
-        ".jp": "Japan", ".ac.jp": "Japan",
-        ".kr": "South Korea", ".ac.kr": "South Korea",
-        ".ca": "Canada",
-        ".in": "India", ".ac.in": "India", ".co.in": "India",
-        ".sg": "Singapore", ".com.sg": "Singapore",
-        ".it": "Italy",
-        ".es": "Spain",
-        ".nl": "Netherlands",
-        ".ru": "Russia",
-        ".br": "Brazil",
-        ".pk": "Pakistan",
-        ".se": "Sweden",
-        ".no": "Norway",
-        ".dk": "Denmark",
-        ".fi": "Finland",
-        ".pl": "Poland",
-        ".ch": "Switzerland",
-        ".at": "Austria",
-        ".be": "Belgium",
-        ".cz": "Czech Republic",
-        ".tr": "Turkey",
-        ".gr": "Greece",
-        ".il": "Israel", ".ac.il": "Israel",
-        ".za": "South Africa", ".ac.za": "South Africa",
-        ".mx": "Mexico",
-        ".ar": "Argentina",
-        ".cl": "Chile",
-        ".co": "Colombia",
-        ".my": "Malaysia",
-        ".id": "Indonesia",
-        ".th": "Thailand",
-        ".vn": "Vietnam",
-        ".ph": "Philippines",
-        ".nz": "New Zealand",
-        ".ie": "Ireland",
-        ".pt": "Portugal",
-        ".hu": "Hungary",
-        ".ro": "Romania",
-        ".ua": "Ukraine",
-        ".ir": "Iran",
-        ".eg": "Egypt",
-        ".sa": "Saudi Arabia",
-        ".ae": "UAE",
-    }
-    for tld in sorted(tld_map, key=len, reverse=True):
-        if domain.endswith(tld):
-            return tld_map[tld]
-    return "Other/Global"
-
-def extract_name_from_email(email):
-    """
-    Strict name extraction — requires at least 2 valid word parts.
-    e.g. john.smith@x.com → John Smith
-         guohao@x.com     → (empty, single token)
-    """
-    STOPWORDS = {
-        "admin", "info", "support", "contact", "mail", "email",
-        "noreply", "no-reply", "help", "team", "office", "phd",
-        "lab", "dept", "university", "research", "group", "center",
-        "cs", "eng", "sci", "edu", "web", "service", "services",
-        # Placeholder / generic words
-        "first", "last", "name", "working", "user", "postdoc",
-    }
-    try:
-        username = email.split("@")[0].lower()
-        parts = re.split(r'[.\-_+]', username)
-        valid_parts = []
-        for part in parts:
-            if not part:
-                continue
-            if part.isdigit():
-                continue
-            if any(c.isdigit() for c in part):
-                continue
-            if len(part) <= 2:
-                continue
-            if part in STOPWORDS:
-                continue
-            valid_parts.append(part.capitalize())
-        if len(valid_parts) < 2:
-            return ""
-        return " ".join(valid_parts)
-    except Exception:
-        return ""
+class InvalidUpload(Exception):
+    pass
 
+class BodyTooLarge(HTTPException):
+    """Raised while a request body is received, so the endpoint never gets it."""
+    def __init__(self):
+        super().__init__(413)
 
-def extract_name_from_email_relaxed(email):
-    """
-    Relaxed name extraction — accepts a single valid word as a name.
-    Used for Sheet 4 on emails that already failed the strict check.
-    e.g. guohao@x.com  → Guohao
-         errolf@x.com  → Errolf
-         cchen151@x.com → (empty, contains digits)
-         admin@x.com   → (empty, stopword)
-    """
-    STOPWORDS = {
-        "admin", "info", "support", "contact", "mail", "email",
-        "noreply", "no-reply", "help", "team", "office", "phd",
-        "lab", "dept", "university", "research", "group", "center",
-        "cs", "eng", "sci", "edu", "web", "service", "services",
-        # Placeholder / generic words
-        "first", "last", "name", "working", "user", "postdoc",
-    }
-    try:
-        username = email.split("@")[0].lower()
-        parts = re.split(r'[.\-_+]', username)
-        valid_parts = []
-        for part in parts:
-            if not part:
-                continue
-            if part.isdigit():
-                continue
-            if any(c.isdigit() for c in part):
-                continue
-            if len(part) <= 2:
-                continue
-            if part in STOPWORDS:
-                continue
-            valid_parts.append(part.capitalize())
-        # Relaxed: accept even a single valid word
-        if len(valid_parts) < 1:
-            return ""
-        return " ".join(valid_parts)
-    except Exception:
-        return ""
+class StaleBaseline(Exception):
+    pass
+
+# Resolved from this file so the module also imports from other directories (e.g. batch_clean.py)
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
 
+app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
 
-def is_name_similar_to_email(name, email):
+class BodyLimit:
     """
-    Checks if the given name is likely associated with the given email.
+    Counts POST body bytes as they are received and fails the request with
+    413 once they exceed the upload limit. Uploads without a Content-Length
+    (chunked) are then refused early too, before the multipart parser spools
+    the rest of them.
     """
-    if is_missing_name(name) or not email:
-        return False
 
-    name = name.lower()
-    # Remove punctuation for matching
-    name_clean = re.sub(r'[^\w\s]', ' ', name)
-    name_parts = [p for p in name_clean.split() if len(p) > 2]
+    def __init__(self, app):
+        self.app = app
 
-    local_part = email.split("@")[0].lower()
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST":
+            return await self.app(scope, receive, send)
+        received = 0
 
-    if not name_parts:
-        return False
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            received += len(message.get("body", b""))
+            if received > MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD:
+                raise BodyTooLarge()
+            return message
+
+        await self.app(scope, limited_receive, send)
 
-    match_count = 0
-    for np in name_parts:
-        if np in local_part:
-            match_count += 1
-            
-    return match_count >= 1
+# Added first, so it is the innermost middleware: raised from the other
+# (task-group based) middlewares' receive, the 413 would turn into a 400
+app.add_middleware(BodyLimit)
+
+@app.exception_handler(BodyTooLarge)
+async def body_too_large(request, exc):
+    return JSONResponse({"error": f"File too large (limit {MAX_UPLOAD_BYTES // (1024 * 1024)} MB)"}, status_code=413)
+
+# Endpoints whose work runs on JOB_EXECUTOR
+QUEUED_PATHS = ("/process-excel", "/classify/stream")
+
+@app.middleware("http")
+async def reject_before_upload(request, call_next):
+    # Runs before the endpoint, so these refusals come before the body is read
+    if request.method != "POST":
+        return await call_next(request)
+    length = request.headers.get("content-length", "")
+    if length.isdigit() and int(length) > MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD:
+        return JSONResponse({"error": f"File too large (limit {MAX_UPLOAD_BYTES // (1024 * 1024)} MB)"}, status_code=413)
+    # Shed load while the job queue is full rather than receive an upload that cannot be queued
+    if request.url.path.rstrip("/") in QUEUED_PATHS and JOB_EXECUTOR.is_full():
+        return _server_busy()
+    return await call_next(request)
+
+@app.get("/")
+async def read_root():
+    return FileResponse(os.path.join(STATIC_DIR, "index.html"))
+
+# The web UI uploads inline unless this is set. Background jobs need their
+# polls to reach the same process, which serverless hosts do not guarantee.
+UI_BACKGROUND_JOBS = os.getenv("UI_BACKGROUND_JOBS", "0") != "0"
+
+@app.get("/ui-config")
+async def ui_config():
+    return {"background": UI_BACKGROUND_JOBS}
 
 
 # ======================
-# API ENDPOINT
+# RULES VERSION
 # ======================
+# Identifies the cleaning rules for caches (result cache key, verdict store,
+# delta state). The fingerprint covers the rule tables; bump RULES_REVISION
+# whenever helper logic or the way sheets are derived (dedup, order) changes.
+#   3: verdicts carry their rejection rule
+#   4: sheets come from one stable Citations sort (ties keep input order)
+#   5: Similar_Name_Emails keeps the best-scoring email per Name, not the
+#      highest-cited (transliterating name scores)
 
-@app.post("/process-excel/")
-async def process_excel(file: UploadFile = File(...)):
+RULES_REVISION = 5
 
-    uid = str(uuid.uuid4())
-    input_path = f"{UPLOAD_DIR}/{uid}_input.xlsx"
-    output_path = f"{UPLOAD_DIR}/{uid}_output.xlsx"
+def rules_version():
+    tables = [
+        RULES_REVISION, EMAIL_REGEX.pattern, MISSING_NAME_VALUES, JUNK_BLOCK_WORDS,
+        JUNK_PLACEHOLDER_TOKENS, JUNK_DOMAIN_PREFIXES, MAX_LOCAL_PART_LENGTH,
+        sorted(NAME_STOPWORDS), sorted(SUFFIX_TABLE.items()),
+        sorted(FOLDED_LETTERS.items()), sorted(TRANSLITERATIONS.items()),
+    ]
+    return hashlib.sha256(json.dumps(tables).encode()).hexdigest()[:16]
 
-    with open(input_path, "wb") as f:
-        f.write(await file.read())
 
-    df = pd.read_excel(input_path)
+# ======================
+# EMAIL VERDICTS
+# ======================
+# Everything derived from an address alone, computed once per distinct email.
+# With the verdict store enabled, verdicts persist across runs (keyed by email
+# and rules version), so a run only evaluates addresses it has not seen before.
+
+VERDICT_STORE_ENABLED = os.getenv("VERDICT_STORE", "1") != "0"
+VERDICT_STORE_PATH = os.getenv("VERDICT_STORE_PATH", os.path.join(UPLOAD_DIR, "email_cleaner_verdicts.sqlite3"))
 
-    all_rows = []
-    similar_rows = []
-    extracted_rows = []
+_VERDICT_STORE = None
+_VERDICT_STORE_LOCK = threading.Lock()
+
+def verdict_store():
+    """Opens the store on first use (once per process)."""
+    global _VERDICT_STORE
+    with _VERDICT_STORE_LOCK:
+        if _VERDICT_STORE is None:
+            _VERDICT_STORE = VerdictStore(VERDICT_STORE_PATH, rules_version())
+        return _VERDICT_STORE
+
+def email_verdicts(emails):
+    """
+    Returns {email: Verdict} for the distinct emails given. Stored verdicts are
+    fetched in bulk; only the rest are computed, then written back.
+    """
+    emails = set(emails)
+    if not VERDICT_STORE_ENABLED:
+        return {email: compute_verdict(email) for email in emails}
+
+    store = verdict_store()
+    rules = rules_version()
+    verdicts = {email: Verdict(*v) for email, v in store.lookup(emails, rules).items()}
+    fresh = {email: compute_verdict(email) for email in emails if email not in verdicts}
+    if fresh:
+        store.store(fresh, rules)
+        verdicts.update(fresh)
+    return verdicts
+
+
+# ======================
+# CLEANING ENGINES
+# ======================
+# Each engine turns the raw scraper DataFrame into the three per-email
+# tables (All / Similar / Name-Processed) before any dedup or sorting.
+# Engines take the batch's verdicts when the caller already has them
+# (count_emails does), and otherwise look them up through email_verdicts.
+# Everything after that is shared, so both engines produce identical sheets.
+
+# Engines hand over compact columns rather than per-email records: the
+# Similar and Name-Processed tables are positions into the All table (with
+# their own Names), Domain and Country are categoricals holding each distinct
+# string once, and Citations is gathered from the input by row position.
+PLACE_COLUMNS = ["Domain", "Country"]
+
+def _places(domains):
+    """Domain and Country categoricals for per-email domains; countries are looked up per distinct domain."""
+    domain = pd.Categorical(domains)
+    country = pd.Categorical([get_country(d) for d in domain.categories])
+    return domain, pd.Categorical.from_codes(country.codes[domain.codes], country.categories)
+
+def _email_tables(df, rows, names, emails, domains, similar, extracted):
+    """
+    The three per-email tables. rows, names, emails and domains hold one
+    entry per valid email (rows: its position in df); similar and extracted
+    are (positions into those entries, Names) pairs.
+    """
+    domain, country = _places(domains)
+    all_df = pd.DataFrame({
+        "Name":      names,
+        "Email":     emails,
+        "Domain":    domain,
+        "Country":   country,
+        "Citations": df["Citations"].to_numpy()[np.asarray(rows, dtype=np.intp)],
+    }, columns=COLUMNS)
 
-    for _, row in df.iterrows():
+    def subset(positions, subset_names):
+        frame = all_df.take(np.asarray(positions, dtype=np.intp)).reset_index(drop=True)
+        frame["Name"] = subset_names
+        return frame
 
-        original_name = clean_name(row["Name"])
-        citations     = row["Citations"]
+    # Match the all-object empty frames pd.DataFrame(columns=COLUMNS) gives
+    return tuple(
+        frame if not frame.empty else pd.DataFrame(columns=COLUMNS)
+        for frame in (all_df, subset(*similar), subset(*extracted))
+    )
+
+def collect_rows_loop(df, verdicts=None):
+    """
+    Reference engine — a plain Python loop over the input rows. Collects the
+    compact columns _email_tables builds the three tables from: each valid
+    email's row position, Name, Email and Domain, plus positions into those
+    for the Similar and Name-Processed tables.
+    """
+    df = df.reset_index(drop=True)
+    # Judged once per distinct address (through the verdict store, when enabled)
+    if verdicts is None:
+        verdicts = email_verdicts(
+            e.strip() for value in df["All Emails"] if pd.notna(value) for e in str(value).split(",")
+        )
+    rows, names, emails, domains = [], [], [], []
+    similar_at, similar_names = [], []
+    extracted_at, extracted_names = [], []
+
+    columns = zip(df["Name"], df["All Emails"], df["Similar Emails"])
+    for position, (name, all_value, similar_value) in enumerate(columns):
+
+        original_name = clean_name(name)
         name_missing  = is_missing_name(original_name)
 
         # Parse emails
         all_emails = []
-        if pd.notna(row["All Emails"]):
-            all_emails = [e.strip() for e in str(row["All Emails"]).split(",")]
+        if pd.notna(all_value):
+            all_emails = [e.strip() for e in str(all_value).split(",")]
 
         similar_emails = set()
-        if pd.notna(row["Similar Emails"]):
-            similar_emails = {e.strip() for e in str(row["Similar Emails"]).split(",")}
+        if pd.notna(similar_value):
+            similar_emails = {e.strip() for e in str(similar_value).split(",")}
 
         # Only valid emails
-        valid_emails = [e for e in all_emails if e and EMAIL_REGEX.match(e) and not is_junk_email(e)]
+        valid_emails = [e for e in all_emails if verdicts[e].valid]
 
         # First email keeps the real name; extra emails get "None" in Sheet 1
         first_email = valid_emails[0] if valid_emails else None
 
+        # The row's listed similar emails, scored against its name in one pass
+        listed = [e for e in valid_emails if e in similar_emails]
+        scores = dict(zip(listed, name_similarity_scores(original_name, listed)))
+
         for email in valid_emails:
 
-            domain     = email.split("@")[1]
-            country    = get_country(domain)
             is_similar = email in similar_emails
             is_extra   = (email != first_email)
+            at         = len(emails)
 
             # -------- Sheet 1 --------
-            sheet1_name = original_name if not is_extra else "None"
-
-            all_rows.append({
-                "Name":      sheet1_name,
-                "Email":     email,
-                "Domain":    domain,
-                "Country":   country,
-                "Citations": citations
-            })
+            rows.append(position)
+            names.append(original_name if not is_extra else "None")
+            emails.append(email)
+            domains.append(verdicts[email].domain)
 
             # -------- Sheet 2 --------
-            if is_similar and is_name_similar_to_email(original_name, email):
-                similar_rows.append({
-                    "Name":      original_name,
-                    "Email":     email,
-                    "Domain":    domain,
-                    "Country":   country,
-                    "Citations": citations
-                })
+            if is_similar and scores[email] > 0:
+                similar_at.append(at)
+                similar_names.append(original_name)
 
             # -------- Sheet 3 (Python extraction when name missing or extra email) --------
             if (name_missing or is_extra) and not is_similar:
-                extracted_name = extract_name_from_email(email)  # "" if not found
-
-                extracted_rows.append({
-                    "Name":      extracted_name,   # empty string if no name found
-                    "Email":     email,
-                    "Domain":    domain,
-                    "Country":   country,
-                    "Citations": citations
-                })
-
-    columns = ["Name", "Email", "Domain", "Country", "Citations"]
-
-    all_df       = pd.DataFrame(all_rows,       columns=columns).drop_duplicates("Email")
-    
-    # Sheet 2 Deduplication: One email per unique Name (keeps highest citations due to later sort, but we should sort first or handle manually)
-    similar_df   = pd.DataFrame(similar_rows,   columns=columns)
-    if not similar_df.empty:
-        similar_df = similar_df.sort_values("Citations", ascending=False).drop_duplicates("Name")
-    
-    extracted_df = pd.DataFrame(extracted_rows, columns=columns).drop_duplicates("Email")
-
-    all_df       = all_df.sort_values("Citations", ascending=False)
-    similar_df   = similar_df.sort_values("Citations", ascending=False)
-    extracted_df = extracted_df.sort_values("Citations", ascending=False)
+                extracted_at.append(at)
+                extracted_names.append(verdicts[email].name)  # "" if not found
 
-    # -------- Sheet 4: Email_Name_Extracted --------
-    # Take blank-name rows from Name_Processed_Emails and try to infer a name from the email address.
-    # Only keep rows where extraction succeeds (non-empty result).
-    email_name_rows = []
-    blank_name_mask = extracted_df["Name"] == ""
-    for _, row in extracted_df[blank_name_mask].iterrows():
-        # Use the relaxed extractor — the strict one already returned "" for these emails
-        inferred = extract_name_from_email_relaxed(row["Email"])
-        if inferred:
-            r = row.to_dict()
-            r["Name"] = inferred
-            email_name_rows.append(r)
-
-    email_name_df = (
-        pd.DataFrame(email_name_rows, columns=columns)
-        .drop_duplicates("Email")
-        .sort_values("Citations", ascending=False)
-        if email_name_rows
-        else pd.DataFrame(columns=columns)
+    return _email_tables(df, rows, names, emails, domains,
+                         (similar_at, similar_names), (extracted_at, extracted_names))
+
+
+def _map_unique(series, func):
+    """Applies func once per distinct value and broadcasts the result back."""
+    uniques = series.unique()
+    lookup = dict(zip(uniques, map(func, uniques)))
+    return series.map(lookup)
+
+
+def _explode_emails(column):
+    """Splits a comma-separated email column into one stripped email per entry, indexed by row."""
+    present = column[column.notna()]
+    return present.map(lambda v: [e.strip() for e in str(v).split(",")]).explode()
+
+
+def collect_rows_columnar(df, verdicts=None):
+    """
+    Columnar engine — explodes the email columns once and derives every flag
+    as a whole-column operation. Produces the same three tables as
+    collect_rows_loop, row for row.
+
+    String checks go through the Python helpers (once per distinct email,
+    via email_verdicts) rather than pandas .str regex/whitespace methods:
+    with pyarrow-backed strings those use RE2/Arrow semantics (ASCII-only \\w,
+    different whitespace set) and would disagree with the row engine.
+    """
+    df = df.reset_index(drop=True)
+
+    # Per-row name handling
+    names         = _map_unique(df["Name"], clean_name).astype(object)
+    names_missing = _map_unique(names, is_missing_name).astype(bool)
+
+    # One entry per (row, email), row order preserved
+    emails   = _explode_emails(df["All Emails"]).fillna("")
+    if verdicts is None:
+        verdicts = email_verdicts(emails.unique())
+    emails   = emails[emails.map({e: v.valid for e, v in verdicts.items()}).astype(bool)]
+
+    rows   = emails.index.to_numpy()
+    email  = emails.to_numpy()
+
+    # First valid email per row keeps the real name; the rest are extras.
+    # Entries are grouped by row, so each row's first entry starts a run.
+    starts      = np.flatnonzero(np.diff(rows, prepend=-1) != 0)
+    first_email = email[np.repeat(starts, np.diff(starts, append=len(email)))]
+    is_extra    = email != first_email
+
+    # (row, email) pairs as one integer key each: row * distinct emails + email code
+    similar_pairs = _explode_emails(df["Similar Emails"]).fillna("")
+    codes, uniques = pd.factorize(np.concatenate([email, similar_pairs.to_numpy(dtype=object)]))
+    keys = rows.astype(np.int64) * len(uniques) + codes[:len(email)]
+    is_similar = np.isin(keys, similar_pairs.index.to_numpy(dtype=np.int64) * len(uniques) + codes[len(email):])
+
+    original  = names.to_numpy()[rows]
+    missing   = names_missing.to_numpy()[rows]
+
+    # -------- Sheet 2 --------
+    similar_mask = is_similar.copy()
+    similar_mask[is_similar] = np.array(score_name_email_pairs(original[is_similar], email[is_similar])) > 0
+    similar_at = np.flatnonzero(similar_mask)
+
+    # -------- Sheet 3 (Python extraction when name missing or extra email) --------
+    extracted_at = np.flatnonzero((missing | is_extra) & ~is_similar)
+
+    # -------- Sheet 1 --------
+    return _email_tables(
+        df, rows, np.where(is_extra, "None", original), email, [verdicts[e].domain for e in email],
+        (similar_at, original[similar_at]), (extracted_at, [verdicts[e].name for e in email[extracted_at]]),
     )
 
+
+ENGINES = {
+    "rows":     collect_rows_loop,
+    "columnar": collect_rows_columnar,
+    # Runs the pandas-free cleaner_core pipeline where it can (see run_pipeline),
+    # otherwise the same per-row logic on a DataFrame
+    "core":     collect_rows_loop,
+}
+
+DEFAULT_ENGINE = os.getenv("CLEANER_ENGINE", "rows")
+
+
+# ======================
+# PARALLEL EXECUTION
+# ======================
+# workers > 1 cleans contiguous row shards (or streamed batches) in a shared
+# process pool. Results are reassembled in input order before build_sheets,
+# so dedup and sorting behave exactly as in a single process.
+
+POOL_SIZE = int(os.getenv("CLEANER_POOL_SIZE", str(os.cpu_count() or 1)))
+DEFAULT_WORKERS = int(os.getenv("CLEANER_WORKERS", "1"))
+# More shards than workers evens out uneven rows (some carry many more emails)
+SHARDS_PER_WORKER = 4
+
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+def process_pool():
+    """The shared worker pool, started on first use ("spawn" so it is safe alongside threads)."""
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = ProcessPoolExecutor(max_workers=POOL_SIZE, mp_context=multiprocessing.get_context("spawn"))
+    return _POOL
+
+def map_in_order(fn, items, workers=1):
+    """
+    Yields (item, fn(item)) in input order. With workers > 1 the calls run in
+    the process pool, keeping at most 2 * workers items in flight.
+    """
+    if workers <= 1:
+        for item in items:
+            yield item, fn(item)
+        return
+
+    pool = process_pool()
+    pending = collections.deque()
+    for item in items:
+        pending.append((item, pool.submit(fn, item)))
+        if len(pending) >= 2 * workers:
+            item, future = pending.popleft()
+            yield item, future.result()
+    while pending:
+        item, future = pending.popleft()
+        yield item, future.result()
+
+def collect_rows_sharded(df, collect, workers=1, verdicts=None):
+    """
+    Same tables as collect(df), computed over row shards in up to `workers`
+    processes. verdicts are only used in-process; shards look theirs up again.
+    """
+    if workers <= 1 or len(df) < 2:
+        return collect(df, verdicts)
+    n_shards = min(len(df), workers * SHARDS_PER_WORKER)
+    bounds = np.linspace(0, len(df), n_shards + 1).astype(int)
+    shards = (df.iloc[start:end] for start, end in zip(bounds, bounds[1:]))
+    parts = [part for _, part in map_in_order(collect, shards, workers)]
+    return _concat_parts(parts, [df["Citations"].dtype])
+
+
+class StageTimer:
+    """Accumulates wall-clock seconds per pipeline stage, plus the run's row/email counts."""
+
+    def __init__(self):
+        self.stages = {}
+        self.counts = {}
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name, seconds):
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def count(self, name, n):
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + n
+
+    def snapshot(self):
+        with self._lock:
+            return {name: round(seconds, 4) for name, seconds in self.stages.items()}
+
+    def count_snapshot(self):
+        with self._lock:
+            return dict(self.counts)
+
+
+def count_emails(df, timer):
+    """
+    Counts an input batch on timer: "rows", candidate "emails" and
+    "rejected.<rule>" per the verdicts' rejection rule. Returns the verdicts
+    ({email: Verdict}) so the engine does not judge the batch again.
+    """
+    emails = _explode_emails(df["All Emails"]).fillna("").value_counts()
+    verdicts = email_verdicts(emails.index)
+    reasons = emails.index.map(lambda email: verdicts[email].reason)
+    rejected = emails[reasons.notna()].groupby(reasons[reasons.notna()]).sum()
+    timer.count("rows", len(df))
+    timer.count("emails", int(emails.sum()))
+    for rule, n in rejected.items():
+        timer.count(f"rejected.{rule}", int(n))
+    return verdicts
+
+
+# ======================
+# INPUT READERS
+# ======================
+# "pandas" loads the whole input at once. "stream" feeds the engine
+# READ_BATCH_ROWS rows at a time (openpyxl read-only mode for workbooks,
+# chunked readers for CSV/JSONL, record batches for Parquet), so input
+# memory stays flat regardless of file size.
+#
+# Inputs may be XLSX, CSV, Parquet or JSONL with the same four columns.
+
+READ_BATCH_ROWS = int(os.getenv("READ_BATCH_ROWS", "10000"))
+
+def _batch_frame(header, rows):
+    """Builds a DataFrame holding only the input columns from a list of row tuples."""
+    data = {}
+    for column in INPUT_COLUMNS:
+        if column not in header:
+            continue
+        idx = header.index(column)
+        values = [convert_cell(row[idx]) if idx < len(row) else None for row in rows]
+        if column == "Citations":
+            series = pd.Series(values)
+            # An all-empty batch would otherwise come out as object, not NaN floats
+            data[column] = series.astype("float64") if series.isna().all() else series
+        else:
+            data[column] = pd.Series(values, dtype=object)
+    return pd.DataFrame(data)
+
+def iter_excel_batches(path, batch_size=None):
+    """
+    Yields the first worksheet of an .xlsx file as DataFrames of at most
+    batch_size rows, reading it with openpyxl in read-only mode.
+    Completely empty rows are skipped (they carry no emails).
+    """
+    batch_size = batch_size or READ_BATCH_ROWS
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        header = list(next(rows, ()))
+        batch = []
+        for row in rows:
+            if all(v is None for v in row):
+                continue
+            batch.append(row)
+            if len(batch) >= batch_size:
+                yield _batch_frame(header, batch)
+                batch = []
+        if batch or not header:
+            yield _batch_frame(header, batch)
+    finally:
+        wb.close()
+
+# Text columns are read as-is from CSV rather than type-inferred per chunk
+_CSV_TEXT_DTYPES = {"Name": object, "All Emails": object, "Similar Emails": object}
+
+def _require_pyarrow():
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise InvalidUpload("Parquet support requires pyarrow (pip install pyarrow)")
+    return pq
+
+# What the readers raise for empty, truncated or malformed files. pandas'
+# EmptyDataError and ParserError, pyarrow's ArrowInvalid and JSON decode
+# errors are all ValueErrors; openpyxl raises KeyError for missing parts.
+READER_ERRORS = (ValueError, KeyError, EOFError, zipfile.BadZipFile)
+
+@contextlib.contextmanager
+def reader_errors_as_invalid():
+    """Re-raises READER_ERRORS as InvalidUpload (a 400 for the client)."""
+    try:
+        yield
+    except READER_ERRORS as e:
+        raise InvalidUpload(str(e)) from e
+
+def read_input(path, fmt="xlsx"):
+    """Loads a whole input file into one DataFrame."""
+    with reader_errors_as_invalid():
+        if fmt == "csv":
+            return pd.read_csv(path, dtype=_CSV_TEXT_DTYPES)
+        if fmt == "parquet":
+            _require_pyarrow()
+            return pd.read_parquet(path)
+        if fmt == "jsonl":
+            return pd.read_json(path, lines=True, convert_dates=False)
+        return pd.read_excel(path)
+
+def iter_input_batches(path, fmt="xlsx", batch_size=None):
+    """Yields an input file as DataFrames of at most batch_size rows."""
+    batch_size = batch_size or READ_BATCH_ROWS
+    with reader_errors_as_invalid():
+        if fmt == "csv":
+            yield from pd.read_csv(path, dtype=_CSV_TEXT_DTYPES, chunksize=batch_size)
+        elif fmt == "parquet":
+            parquet_file = _require_pyarrow().ParquetFile(path)
+            for record_batch in parquet_file.iter_batches(batch_size=batch_size):
+                yield record_batch.to_pandas()
+        elif fmt == "jsonl":
+            with pd.read_json(path, lines=True, convert_dates=False, chunksize=batch_size) as chunks:
+                yield from chunks
+        else:
+            yield from iter_excel_batches(path, batch_size)
+
+def require_columns(df):
+    missing = [c for c in INPUT_COLUMNS if c not in df.columns]
+    if missing:
+        raise InvalidUpload(f"Missing required column(s): {', '.join(missing)}")
+
+# Several inputs are passed as parallel lists of paths/files and formats and
+# cleaned as one dump: their rows are concatenated in the order given.
+
+def _input_sources(path, fmt):
+    """(path, format) pairs for one input, or for parallel lists of several."""
+    if isinstance(path, list):
+        return list(zip(path, fmt))
+    return [(path, fmt)]
+
+def _read_source(source):
+    df = read_input(*source)
+    require_columns(df)
+    return df
+
+def read_inputs(path, fmt="xlsx"):
+    """
+    read_input over one or several inputs, concatenated in order. Several
+    are parsed concurrently: files on disk in the process pool, in-memory
+    uploads in threads.
+    """
+    sources = _input_sources(path, fmt)
+    if len(sources) == 1:
+        return read_input(*sources[0])
+    workers = min(len(sources), POOL_SIZE)
+    if all(isinstance(source_path, str) for source_path, _ in sources):
+        frames = [df for _, df in map_in_order(_read_source, sources, workers)]
+    else:
+        with ThreadPoolExecutor(workers) as threads:
+            frames = list(threads.map(_read_source, sources))
+    return pd.concat(frames, ignore_index=True)
+
+def iter_inputs_batches(path, fmt="xlsx", batch_size=None):
+    """iter_input_batches over one or several inputs, one after another."""
+    for source_path, source_fmt in _input_sources(path, fmt):
+        yield from iter_input_batches(source_path, source_fmt, batch_size)
+
+def concat_tables(frames):
+    """
+    Concatenates per-email tables in order. Their Domain/Country categoricals
+    first get one shared set of categories, so the result stays categorical.
+    """
+    for column in PLACE_COLUMNS:
+        dtypes = [frame[column].dtype for frame in frames]
+        if len(set(dtypes)) > 1 and all(isinstance(dtype, pd.CategoricalDtype) for dtype in dtypes):
+            categories = functools.reduce(pd.Index.union, (dtype.categories for dtype in dtypes))
+            frames = [frame.assign(**{column: frame[column].cat.set_categories(categories)}) for frame in frames]
+    return pd.concat(frames, ignore_index=True)
+
+def _common_dtype(dtypes):
+    """The dtype pandas would give one column made of all these batches."""
+    if all(pd.api.types.is_numeric_dtype(d) for d in dtypes):
+        return np.result_type(*dtypes)
+    return np.dtype(object)
+
+def _concat_parts(parts, citation_dtypes):
+    """
+    Concatenates per-batch (all, similar, extracted) tables in order, giving
+    Citations the dtype the whole column would have had.
+    """
+    citations_dtype = _common_dtype(citation_dtypes)
+    frames = []
+    for i in range(3):
+        pieces = [p[i] for p in parts if not p[i].empty]
+        frame = concat_tables(pieces) if pieces else parts[0][i]
+        if not frame.empty and frame["Citations"].dtype != citations_dtype:
+            frame["Citations"] = frame["Citations"].astype(citations_dtype)
+        frames.append(frame)
+    return tuple(frames)
+
+def _collect_batch(item, collect):
+    batch, verdicts = item
+    return collect(batch, verdicts)
+
+def collect_rows_streaming(path, collect, batch_size=None, fmt="xlsx", timer=None, progress=None, workers=1):
+    """
+    Runs an engine over the input batch by batch and concatenates the
+    per-email tables in input order. progress(n) is called after each batch.
+    With workers > 1 batches are cleaned in the process pool while the next
+    ones are read, with at most 2 * workers batches in flight.
+    """
+    timer = timer or StageTimer()
+    citation_dtypes = []
+
+    def batches():
+        source = iter_inputs_batches(path, fmt, batch_size)
+        while True:
+            with timer.stage("read"):
+                batch = next(source, None)
+            if batch is None:
+                return
+            require_columns(batch)
+            citation_dtypes.append(batch["Citations"].dtype)
+            verdicts = count_emails(batch, timer)
+            # Pool workers look their verdicts up again rather than receive them pickled
+            yield batch, (verdicts if workers <= 1 else None)
+
+    parts = []
+    read_before = timer.stages.get("read", 0.0)
+    start = time.perf_counter()
+    for (batch, _), part in map_in_order(functools.partial(_collect_batch, collect=collect), batches(), workers):
+        parts.append(part)
+        if progress:
+            progress(len(batch))
+    # Reading happens inside the loop; book the remainder as cleaning
+    timer.add("clean", time.perf_counter() - start - (timer.stages.get("read", 0.0) - read_before))
+
+    if not parts:
+        return collect(pd.DataFrame(columns=INPUT_COLUMNS))
+    return _concat_parts(parts, citation_dtypes)
+
+
+READERS = ["pandas", "stream"]
+
+DEFAULT_READER = os.getenv("CLEANER_READER", "pandas")
+
+
+# Tables stacked into the master table, tagged by position in this list
+SOURCE_TABLES = ["all", "similar", "extracted"]
+
+def _first_occurrences(values):
+    """Boolean mask keeping the first occurrence of each value."""
+    return ~pd.Series(values).duplicated().to_numpy()
+
+def build_sheets(all_df, similar_df, extracted_df):
+    """
+    Derives the six output sheets from one citation-ordered master table.
+    Returns (sheets, summary_data) where sheets is ordered as written.
+
+    The three per-email tables are stacked and sorted by Citations once
+    (stable, so equal counts keep input order); every sheet is a masked
+    view of that order and every Summary count a mask sum.
+    """
+    # Email dedup keeps the first occurrence in input order, so it is applied before sorting
+    all_df       = all_df[_first_occurrences(all_df["Email"])]
+    extracted_df = extracted_df[_first_occurrences(extracted_df["Email"])]
+
+    parts = [
+        frame[COLUMNS].assign(_source=source)
+        for source, frame in enumerate([all_df, similar_df, extracted_df])
+        if not frame.empty
+    ]
+    if parts:
+        master = (
+            concat_tables(parts)
+            .sort_values("Citations", ascending=False, kind="stable")
+            .reset_index(drop=True)
+        )
+    else:
+        master = pd.DataFrame(columns=[*COLUMNS, "_source"])
+
+    names  = master["Name"].to_numpy(dtype=object)
+    emails = master["Email"].to_numpy(dtype=object)
+    source = master["_source"].to_numpy()
+
+    all_mask       = source == SOURCE_TABLES.index("all")
+    extracted_mask = source == SOURCE_TABLES.index("extracted")
+
+    # Sheet 2 Deduplication: one email per unique Name — the one scoring best
+    # against the name, the highest-cited on ties
+    similar_rows = np.flatnonzero(source == SOURCE_TABLES.index("similar"))
+    scores = np.array(score_name_email_pairs(names[similar_rows], emails[similar_rows]), dtype=float)
+    ranked = similar_rows[np.argsort(-scores, kind="stable")]
+    similar_mask = np.zeros(len(master), dtype=bool)
+    similar_mask[ranked[_first_occurrences(names[ranked])]] = True
+
+    # -------- Sheet 4: Email_Name_Extracted --------
+    # Blank-name rows of Name_Processed_Emails where the relaxed extractor
+    # (the strict one already returned "") infers a name from the email.
+    blank_mask = extracted_mask & (names == "")
+    named_mask = extracted_mask & ~blank_mask
+    verdicts = email_verdicts(emails[blank_mask])
+    relaxed = np.full(len(master), "", dtype=object)
+    relaxed[blank_mask] = [verdicts[e].relaxed_name for e in emails[blank_mask]]
+    email_name_mask = blank_mask & (relaxed != "")
+
     # -------- Sheet 5: Final_Combined --------
-    # Merge: Similar_Name_Emails + named rows from Name_Processed_Emails + Email_Name_Extracted
-    named_extracted_df = extracted_df[extracted_df["Name"] != ""].copy()
-
-    final_combined_df = (
-        pd.concat([similar_df, named_extracted_df, email_name_df], ignore_index=True)
-        .drop_duplicates("Email")
-        .sort_values("Citations", ascending=False)
-        .reset_index(drop=True)
-    )
+    # Similar_Name_Emails + named Name_Processed_Emails + Email_Name_Extracted,
+    # one row per Email; a Similar_Name_Emails row wins over the others.
+    final_mask = similar_mask.copy()
+    final_mask[similar_mask] = _first_occurrences(emails[similar_mask])
+    final_mask |= (named_mask | email_name_mask) & ~pd.Series(emails).isin(emails[similar_mask]).to_numpy()
 
-    # -------- Summary Statistics --------
-    s1_count       = len(all_df)
-    s2_count       = len(similar_df)
-    s3_named_count = len(extracted_df[extracted_df["Name"] != ""])
-    s3_blank_count = len(extracted_df[extracted_df["Name"] == ""])
-    s4_count       = len(email_name_df)
-    s5_count       = len(final_combined_df)
+    view = master[COLUMNS]
+
+    def sheet(mask, source_table, **columns):
+        """Masked view of the master table, or the source table's empty frame."""
+        if not mask.any():
+            return source_table.iloc[0:0][COLUMNS] if not source_table.empty else pd.DataFrame(columns=COLUMNS)
+        return view[mask].assign(**{k: v[mask] for k, v in columns.items()})
+
+    all_clean_df      = sheet(all_mask, all_df)
+    similar_name_df   = sheet(similar_mask, similar_df)
+    name_processed_df = sheet(extracted_mask, extracted_df)
+    email_name_df     = sheet(email_name_mask, pd.DataFrame(), Name=relaxed)
+    final_combined_df = sheet(final_mask, pd.DataFrame(), Name=np.where(email_name_mask, relaxed, names)).reset_index(drop=True)
 
+    # -------- Summary Statistics --------
     summary_data = [
-        {"Metric": "Sheet 2 Total (All Clean)",        "Count": s1_count},
-        {"Metric": "Sheet 3 (Similar Name Emails)",    "Count": s2_count},
-        {"Metric": "Sheet 4 (Name Found)",             "Count": s3_named_count},
-        {"Metric": "Sheet 4 (Name Blank)",             "Count": s3_blank_count},
-        {"Metric": "Sheet 5 (Email Name Extracted)",   "Count": s4_count},
-        {"Metric": "Sheet 6 Final Combined",           "Count": s5_count},
+        {"Metric": "Sheet 2 Total (All Clean)",        "Count": int(all_mask.sum())},
+        {"Metric": "Sheet 3 (Similar Name Emails)",    "Count": int(similar_mask.sum())},
+        {"Metric": "Sheet 4 (Name Found)",             "Count": int(named_mask.sum())},
+        {"Metric": "Sheet 4 (Name Blank)",             "Count": int(blank_mask.sum())},
+        {"Metric": "Sheet 5 (Email Name Extracted)",   "Count": int(email_name_mask.sum())},
+        {"Metric": "Sheet 6 Final Combined",           "Count": int(final_mask.sum())},
     ]
-    summary_df = pd.DataFrame(summary_data)
 
-    with pd.ExcelWriter(output_path, engine="openpyxl") as writer:
-        summary_df.to_excel(writer,        sheet_name="Summary",               index=False)
-        all_df.to_excel(writer,            sheet_name="All_Clean_Emails",      index=False)
-        similar_df.to_excel(writer,        sheet_name="Similar_Name_Emails",   index=False)
-        extracted_df.to_excel(writer,      sheet_name="Name_Processed_Emails", index=False)
-        email_name_df.to_excel(writer,     sheet_name="Email_Name_Extracted",  index=False)
-        final_combined_df.to_excel(writer, sheet_name="Final_Combined",        index=False)
+    sheets = {
+        "Summary":               pd.DataFrame(summary_data),
+        "All_Clean_Emails":      all_clean_df,
+        "Similar_Name_Emails":   similar_name_df,
+        "Name_Processed_Emails": name_processed_df,
+        "Email_Name_Extracted":  email_name_df,
+        "Final_Combined":        final_combined_df,
+    }
+    return sheets, summary_data
+
+
+# ======================
+# OUTPUT WRITERS
+# ======================
+# "pandas" goes through pd.ExcelWriter, which builds the full openpyxl object
+# model before saving. "stream" uses an openpyxl write-only workbook: rows are
+# serialised as they are appended, so memory stays constant per sheet.
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+def write_workbook_pandas(sheets, output):
+    with pd.ExcelWriter(output, engine="openpyxl") as writer:
+        for sheet_name, sheet_df in sheets.items():
+            sheet_df.to_excel(writer, sheet_name=sheet_name, index=False)
+
+WRITE_BATCH_ROWS = 10000
+
+def write_workbook_streaming(sheets, output):
+    wb = openpyxl.Workbook(write_only=True)
+    for sheet_name, sheet_df in sheets.items():
+        ws = wb.create_sheet(sheet_name)
+        ws.append(list(sheet_df.columns))
+
+        # Converted a slice at a time: NaN → empty cell, numpy scalars → Python values
+        for start in range(0, len(sheet_df), WRITE_BATCH_ROWS):
+            chunk = sheet_df.iloc[start:start + WRITE_BATCH_ROWS]
+            values = chunk.astype(object).where(chunk.notna(), None)
+            for row in values.itertuples(index=False, name=None):
+                ws.append(row)
+    wb.save(output)
+
+WRITERS = {
+    "pandas": write_workbook_pandas,
+    "stream": write_workbook_streaming,
+}
+
+DEFAULT_WRITER = os.getenv("CLEANER_WRITER", "pandas")
+
+def write_workbook(sheets, output, writer="pandas"):
+    """Writes the sheets to a path or binary file object."""
+    WRITERS[writer](sheets, output)
+
+def write_csv_zip(sheets, output):
+    """One <Sheet>.csv member per sheet inside a zip archive."""
+    with zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED) as zf:
+        for sheet_name, sheet_df in sheets.items():
+            with zf.open(f"{sheet_name}.csv", "w") as member:
+                with io.TextIOWrapper(member, encoding="utf-8", newline="") as text:
+                    sheet_df.to_csv(text, index=False)
+
+def write_parquet_zip(sheets, output):
+    """One <Sheet>.parquet member per sheet inside a zip archive."""
+    _require_pyarrow()
+    with zipfile.ZipFile(output, "w", zipfile.ZIP_STORED) as zf:
+        for sheet_name, sheet_df in sheets.items():
+            buffer = io.BytesIO()
+            # Domain/Country are written as plain strings, not dictionary-typed columns
+            plain = {c: t.categories.dtype for c, t in sheet_df.dtypes.items() if isinstance(t, pd.CategoricalDtype)}
+            sheet_df.astype(plain).to_parquet(buffer, index=False)
+            zf.writestr(f"{sheet_name}.parquet", buffer.getvalue())
+
+def write_jsonl(sheets, output):
+    """One JSON object per row, tagged with the sheet it belongs to."""
+    with _binary_output(output) as f:
+        for sheet_name, sheet_df in sheets.items():
+            for start in range(0, len(sheet_df), WRITE_BATCH_ROWS):
+                chunk = sheet_df.iloc[start:start + WRITE_BATCH_ROWS]
+                chunk = chunk.assign(Sheet=sheet_name)[["Sheet", *sheet_df.columns]]
+                f.write(chunk.to_json(orient="records", lines=True, force_ascii=False).encode("utf-8"))
+
+# format → (file extension, media type)
+OUTPUT_FORMATS = {
+    "xlsx":    ("xlsx",        XLSX_MEDIA_TYPE),
+    "csv":     ("csv.zip",     "application/zip"),
+    "parquet": ("parquet.zip", "application/zip"),
+    "jsonl":   ("jsonl",       "application/x-ndjson"),
+}
+
+DEFAULT_OUTPUT_FORMAT = os.getenv("CLEANER_OUTPUT_FORMAT", "xlsx")
+
+def write_output(sheets, output, fmt="xlsx", writer="pandas"):
+    """Writes the sheets in the requested output format to a path or binary file object."""
+    if fmt == "csv":
+        write_csv_zip(sheets, output)
+    elif fmt == "parquet":
+        write_parquet_zip(sheets, output)
+    elif fmt == "jsonl":
+        write_jsonl(sheets, output)
+    else:
+        write_workbook(sheets, output, writer)
+
+def find_output(uid):
+    """Returns (path, format) of a stored result, or (None, None)."""
+    for fmt, (ext, _) in OUTPUT_FORMATS.items():
+        path = f"{UPLOAD_DIR}/{uid}_output.{ext}"
+        if os.path.exists(path):
+            return path, fmt
+    return None, None
+
+def _iter_file(f, chunk_size=UPLOAD_CHUNK_SIZE):
+    try:
+        f.seek(0)
+        while chunk := f.read(chunk_size):
+            yield chunk
+    finally:
+        f.close()
+
+def _choice_error(option, value, choices):
+    """400 response for an unknown option value, or None if it is valid."""
+    if value in choices:
+        return None
+    return JSONResponse(
+        {"error": f"Unknown {option} '{value}'. Choose one of: {', '.join(choices)}"},
+        status_code=400
+    )
+
+
+# ======================
+# SHEET EXPORTS
+# ======================
+# /download/{uid}/{sheet} serves one sheet of a stored result as CSV or XLSX.
+# Only that sheet is read from the stored format (read-only workbook, zip
+# member or matching JSONL lines), and the export is kept for later requests.
+
+SHEET_NAMES = [
+    "Summary", "All_Clean_Emails", "Similar_Name_Emails",
+    "Name_Processed_Emails", "Email_Name_Extracted", "Final_Combined",
+]
+
+# format → (file extension, media type)
+SHEET_FORMATS = {
+    "csv":  ("csv",  "text/csv; charset=utf-8"),
+    "xlsx": ("xlsx", XLSX_MEDIA_TYPE),
+}
+
+def _frame_rows(header, chunks):
+    """The header, then each row of the DataFrame chunks (NaN → None, numpy scalars → Python values)."""
+    yield tuple(header)
+    for chunk in chunks:
+        values = chunk.astype(object).where(chunk.notna(), None)
+        yield from values.itertuples(index=False, name=None)
+
+def iter_sheet_rows(source, fmt, sheet):
+    """Yields the header and rows of one sheet of a stored result (path or binary file object)."""
+    if fmt == "xlsx":
+        wb = openpyxl.load_workbook(source, read_only=True, data_only=True)
+        try:
+            rows = wb[sheet].iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                return
+            yield header
+            # The write-only writer leaves trailing empty cells out; pad rows back to full width
+            width = len(header)
+            for row in rows:
+                yield row + (None,) * (width - len(row)) if len(row) < width else row
+        finally:
+            wb.close()
+    elif fmt == "csv":
+        with zipfile.ZipFile(source) as zf, zf.open(f"{sheet}.csv") as member:
+            # Only empty fields are missing — "None" / "NA" are real names
+            chunks = pd.read_csv(member, chunksize=WRITE_BATCH_ROWS, keep_default_na=False, na_values=[""])
+            first = next(chunks)
+            yield from _frame_rows(first.columns, itertools.chain([first], chunks))
+    elif fmt == "parquet":
+        pq = _require_pyarrow()
+        with zipfile.ZipFile(source) as zf, zf.open(f"{sheet}.parquet") as member:
+            parquet_file = pq.ParquetFile(member)
+            batches = parquet_file.iter_batches(batch_size=WRITE_BATCH_ROWS)
+            yield from _frame_rows(parquet_file.schema_arrow.names, (b.to_pandas() for b in batches))
+    else:
+        header = None
+        with _binary_input(source) as f:
+            for line in f:
+                record = json.loads(line)
+                if record.pop("Sheet") != sheet:
+                    continue
+                if header is None:
+                    header = list(record)
+                    yield tuple(header)
+                yield tuple(record[c] for c in header)
+        if header is None:
+            yield tuple(["Metric", "Count"] if sheet == "Summary" else COLUMNS)
+
+def export_sheet(source, fmt, sheet, sheet_format, output):
+    """Writes one sheet of a stored result as CSV or XLSX to a path or binary file object."""
+    if sheet_format == "csv" and fmt == "csv":
+        # Already CSV inside the zip — copy the member as-is
+        with zipfile.ZipFile(source) as zf, zf.open(f"{sheet}.csv") as member, _binary_output(output) as f:
+            shutil.copyfileobj(member, f)
+        return
+
+    rows = iter_sheet_rows(source, fmt, sheet)
+    if sheet_format == "csv":
+        with _binary_output(output) as f:
+            text = io.TextIOWrapper(f, encoding="utf-8", newline="")
+            csv.writer(text, lineterminator="\n").writerows(("" if v is None else v for v in row) for row in rows)
+            text.detach()
+    else:
+        wb = openpyxl.Workbook(write_only=True)
+        ws = wb.create_sheet(sheet)
+        for row in rows:
+            ws.append(row)
+        wb.save(output)
+
+
+# ======================
+# DELTA MODE
+# ======================
+# Every stored run also keeps its per-email tables in {uid}_state.pkl, each
+# row tagged with two hashes of the input row it came from: ORIGIN over all
+# four columns and IDENTITY over all but Citations. A run with baseline=<uid>
+# skips input rows whose ORIGIN is in that state. Of the rest, a row whose
+# IDENTITY matches a baseline row missing from the input is that row with an
+# updated count, so only its Citations are refreshed; the others are cleaned
+# and appended — the same sheets as a full run over the baseline rows
+# followed by the new ones.
+
+DELTA_STATE_ENABLED = os.getenv("DELTA_STATE", "1") != "0"
+
+ORIGIN = "_origin"
+IDENTITY = "_identity"
+DELTA_COLUMNS = [ORIGIN, IDENTITY]
+
+IDENTITY_COLUMNS = ["Name", "All Emails", "Similar Emails"]
+
+# Bumped when the saved state's layout changes; older baselines are refused
+STATE_VERSION = 2
+
+def state_path(uid):
+    return f"{UPLOAD_DIR}/{uid}_state.pkl"
+
+def row_identities(df):
+    """A 64-bit hash per input row of everything but Citations, independent of the columns' dtypes."""
+    return pd.util.hash_pandas_object(df[IDENTITY_COLUMNS].astype(str), index=False).to_numpy()
+
+def row_fingerprints(df):
+    """
+    A 64-bit hash per input row, Citations included. Counts are hashed by
+    value (5 and 5.0 agree), so a dump whose column turned float still matches.
+    """
+    numbers = pd.to_numeric(df["Citations"], errors="coerce").astype("float64")
+    text = df["Citations"].where(numbers.isna()).astype(str)
+    keys = pd.DataFrame({"identity": row_identities(df), "number": numbers.to_numpy(), "text": text.to_numpy()})
+    return pd.util.hash_pandas_object(keys, index=False).to_numpy()
+
+def collect_with_origin(df, verdicts=None, collect=None):
+    """
+    collect(df, verdicts) with ORIGIN and IDENTITY columns on every table.
+    The engine is run with Citations replaced by row positions, which it
+    passes through untouched; the real values are put back afterwards.
+    """
+    df = df.reset_index(drop=True)
+    fingerprints = row_fingerprints(df)
+    identities = row_identities(df)
+    citations = df["Citations"].to_numpy()
+    frames = []
+    for frame in collect(df.assign(Citations=np.arange(len(df))), verdicts):
+        if frame.empty:
+            frames.append(frame.assign(**{ORIGIN: [], IDENTITY: []}))
+            continue
+        rows = frame["Citations"].to_numpy(dtype=np.int64)
+        frames.append(frame.assign(Citations=citations[rows], **{ORIGIN: fingerprints[rows], IDENTITY: identities[rows]}))
+    return tuple(frames)
+
+def save_state(frames, path):
+    pd.to_pickle({"rules": rules_version(), "version": STATE_VERSION, "frames": frames}, path)
+
+def load_state(path):
+    state = pd.read_pickle(path)
+    if state.get("version", 1) != STATE_VERSION:
+        raise StaleBaseline("Baseline was saved by an older version; reprocess it in full")
+    if state["rules"] != rules_version():
+        raise StaleBaseline("Baseline was cleaned with different rules; reprocess it in full")
+    return state["frames"]
+
+def _concat_hashes(parts):
+    return np.concatenate(parts) if parts else np.array([], dtype=np.uint64)
+
+def read_delta(input_path, input_format, baseline, reader="pandas"):
+    """
+    Returns (new_rows, updates) for the baseline's ORIGIN/IDENTITY pairs.
+    Input rows whose ORIGIN is in the baseline are unchanged. The k-th
+    remaining row of an IDENTITY updates the k-th baseline row of that
+    IDENTITY the input no longer has: updates holds its Citations and new
+    ORIGIN, indexed by the old ORIGIN. All other rows are new_rows.
+    With the stream reader only the unmatched rows are held in memory.
+    """
+    if reader == "stream":
+        batches = iter_inputs_batches(input_path, input_format)
+    else:
+        batches = [read_inputs(input_path, input_format)]
+
+    known = baseline[ORIGIN].unique()
+    present, new_parts, new_origins = [], [], []
+    for batch in batches:
+        require_columns(batch)
+        fingerprints = row_fingerprints(batch)
+        seen = np.isin(fingerprints, known)
+        present.append(fingerprints[seen])
+        new_parts.append(batch[~seen])
+        new_origins.append(fingerprints[~seen])
+
+    new_rows = pd.concat(new_parts, ignore_index=True) if new_parts else pd.DataFrame(columns=INPUT_COLUMNS)
+    new_origins = _concat_hashes(new_origins)
+    new_identities = row_identities(new_rows)
+
+    # Pair baseline rows gone from the input with unmatched rows of the same IDENTITY, in order
+    rows = baseline.drop_duplicates(ORIGIN)
+    gone = rows[~rows[ORIGIN].isin(_concat_hashes(present))]
+    gone = gone.assign(_k=gone.groupby(IDENTITY).cumcount().to_numpy())
+    fresh = pd.DataFrame({IDENTITY: new_identities, "_row": np.arange(len(new_rows))})
+    fresh["_k"] = fresh.groupby(IDENTITY).cumcount()
+    pairs = gone.merge(fresh, on=[IDENTITY, "_k"])
+    positions = pairs["_row"].to_numpy(dtype=np.intp)
+
+    updates = pd.DataFrame(
+        {"Citations": new_rows["Citations"].to_numpy()[positions], ORIGIN: new_origins[positions]},
+        index=pairs[ORIGIN].to_numpy(dtype=np.uint64),
+    )
+    return new_rows.drop(index=positions).reset_index(drop=True), updates
+
+def merge_delta(baseline_frames, delta_frames, updates):
+    """Baseline tables with refreshed Citations (and ORIGINs), followed by the delta's rows."""
+    merged = []
+    for base, delta in zip(baseline_frames, delta_frames):
+        at = updates.index.get_indexer(base[ORIGIN])
+        known = at >= 0
+        if known.any():
+            origins = base[ORIGIN].to_numpy(copy=True)
+            origins[known] = updates[ORIGIN].to_numpy()[at[known]]
+            base = base.assign(**{
+                "Citations": base[ORIGIN].map(updates["Citations"]).where(known, base["Citations"]),
+                ORIGIN: origins,
+            })
+        pieces = [frame for frame in (base, delta) if not frame.empty]
+        merged.append(concat_tables(pieces) if pieces else base)
+    return tuple(merged)
+
+
+# ======================
+# SUPPRESSION
+# ======================
+# Emails already used by earlier campaigns (see suppression.py) are dropped
+# from every table after cleaning, so no sheet exports them. Delta state is
+# saved before this step: a later delta applies the index as it is then.
+
+SUPPRESSION_ENABLED = os.getenv("SUPPRESSION_INDEX", "1") != "0"
+SUPPRESSION_PATH = os.getenv("SUPPRESSION_INDEX_PATH", os.path.join(UPLOAD_DIR, "email_cleaner_suppression.sqlite3"))
+
+_SUPPRESSION_INDEX = None
+_SUPPRESSION_INDEX_LOCK = threading.Lock()
+
+def suppression_index():
+    """Opens the index on first use (once per process)."""
+    global _SUPPRESSION_INDEX
+    with _SUPPRESSION_INDEX_LOCK:
+        if _SUPPRESSION_INDEX is None:
+            _SUPPRESSION_INDEX = SuppressionIndex(SUPPRESSION_PATH)
+        return _SUPPRESSION_INDEX
+
+def suppressed_emails(emails, index, timer):
+    """The suppressed ones among emails, counted on timer as "suppressed" (distinct emails)."""
+    suppressed = index.suppressed(set(emails))
+    timer.count("suppressed", len(suppressed))
+    return suppressed
+
+def suppress_frames(frames, index, timer):
+    emails = itertools.chain.from_iterable(frame["Email"] for frame in frames)
+    suppressed = suppressed_emails(emails, index, timer)
+    if not suppressed:
+        return frames
+    return tuple(frame[~frame["Email"].isin(suppressed)] for frame in frames)
+
+
+# ======================
+# PIPELINE
+# ======================
+
+def core_pipeline_applies(engine, input_format, output, state_path=None, baseline_path=None):
+    """engine=core skips pandas unless the run needs it: Parquet, or delta state."""
+    formats = input_format if isinstance(input_format, list) else [input_format]
+    return (engine == "core" and not state_path and not baseline_path and output in cleaner_core.CORE_FORMATS
+            and all(fmt in cleaner_core.CORE_FORMATS for fmt in formats))
+
+def run_core_pipeline(input_path, input_format, output_target, output="xlsx", timer=None, progress=None,
+                      suppression=None):
+    """run_pipeline on cleaner_core: the same stages, timings and counts, without pandas."""
+    timer = timer or StageTimer()
+    with timer.stage("read"), reader_errors_as_invalid():
+        rows = cleaner_core.read_rows(input_path, input_format)
+    with timer.stage("clean"):
+        counts = {}
+        tables = cleaner_core.collect_rows(rows, counts, email_verdicts)
+        timer.count("rows", len(rows))
+        for name, n in counts.items():
+            timer.count(name, n)
+    if progress:
+        progress(len(rows))
+
+    if suppression is not None:
+        with timer.stage("suppress"):
+            emails = (row[cleaner_core.EMAIL] for table in tables for row in table)
+            suppressed = suppressed_emails(emails, suppression, timer)
+            tables = tuple([row for row in table if row[cleaner_core.EMAIL] not in suppressed] for table in tables)
+
+    with timer.stage("build_sheets"):
+        sheets, summary_data = cleaner_core.build_sheets(*tables)
+
+    with timer.stage("write"):
+        cleaner_core.write_output(sheets, output_target, output)
+
+    return summary_data
+
+def run_pipeline(input_path, input_format, output_target, engine="rows", reader="pandas",
+                 writer="pandas", output="xlsx", workers=1, timer=None, progress=None,
+                 state_path=None, baseline_path=None, suppression=None):
+    """
+    Read → clean → build sheets → write, timing each stage on timer.
+    input_path and output_target are paths or binary file objects;
+    input_path / input_format may be lists to clean several inputs as one.
+    Returns the summary stats.
+    The per-email tables are saved to state_path when given; with
+    baseline_path only rows missing from that saved state are cleaned.
+    Emails in the suppression index, when given, are dropped from all tables.
+    """
+    timer = timer or StageTimer()
+    if core_pipeline_applies(engine, input_format, output, state_path, baseline_path):
+        return run_core_pipeline(input_path, input_format, output_target, output, timer, progress, suppression)
+
+    collect = ENGINES[engine]
+    if state_path or baseline_path:
+        collect = functools.partial(collect_with_origin, collect=collect)
+
+    if baseline_path:
+        with timer.stage("read"):
+            baseline_frames = load_state(baseline_path)
+            new_rows, updates = read_delta(input_path, input_format, baseline_frames[0][DELTA_COLUMNS], reader)
+        with timer.stage("clean"):
+            verdicts = count_emails(new_rows, timer)
+            frames = merge_delta(baseline_frames, collect_rows_sharded(new_rows, collect, workers, verdicts), updates)
+        if progress:
+            progress(len(new_rows))
+    elif reader == "stream":
+        frames = collect_rows_streaming(input_path, collect, fmt=input_format, timer=timer,
+                                        progress=progress, workers=workers)
+    else:
+        with timer.stage("read"):
+            df = read_inputs(input_path, input_format)
+            require_columns(df)
+        with timer.stage("clean"):
+            verdicts = count_emails(df, timer)
+            frames = collect_rows_sharded(df, collect, workers, verdicts)
+        if progress:
+            progress(len(df))
+
+    if state_path or baseline_path:
+        if state_path:
+            with timer.stage("save_state"):
+                save_state(frames, state_path)
+        frames = tuple(frame.drop(columns=DELTA_COLUMNS) for frame in frames)
+
+    if suppression is not None:
+        with timer.stage("suppress"):
+            frames = suppress_frames(frames, suppression, timer)
+
+    with timer.stage("build_sheets"):
+        sheets, summary_data = build_sheets(*frames)
+
+    with timer.stage("write"):
+        write_output(sheets, output_target, output, writer)
+
+    return summary_data
+
+
+# ======================
+# ADMISSION CONTROL
+# ======================
+# All pipeline runs (inline and background) execute on JOB_EXECUTOR, never on
+# the event loop. At most JOB_WORKERS run at once and at most JOB_QUEUE_DEPTH
+# wait; beyond that requests are shed with 503 + Retry-After. Waiting runs
+# are started smallest input first, so interactive uploads overtake batches.
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_QUEUE_DEPTH = int(os.getenv("JOB_QUEUE_DEPTH", "8"))
+RETRY_AFTER_SECONDS = int(os.getenv("RETRY_AFTER_SECONDS", "10"))
+
+class JobQueueFull(Exception):
+    pass
+
+class PriorityExecutor:
+    """
+    Fixed pool of worker threads that always starts the queued task with the
+    lowest priority value (ties in submission order). submit() raises
+    JobQueueFull when max_queued tasks are already waiting.
+    """
+
+    def __init__(self, workers, max_queued, name="cleaner-job"):
+        self.max_queued = max_queued
+        self.running = 0
+        self._queue = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        for i in range(workers):
+            threading.Thread(target=self._work, name=f"{name}-{i}", daemon=True).start()
+
+    @property
+    def queued(self):
+        return len(self._queue)
+
+    def is_full(self):
+        with self._cond:
+            return len(self._queue) >= self.max_queued
+
+    def submit(self, priority, fn, *args, **kwargs):
+        future = Future()
+        with self._cond:
+            if len(self._queue) >= self.max_queued:
+                raise JobQueueFull()
+            heapq.heappush(self._queue, (priority, next(self._seq), future, fn, args, kwargs))
+            self._cond.notify()
+        return future
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                _, _, future, fn, args, kwargs = heapq.heappop(self._queue)
+                self.running += 1
+            try:
+                if future.set_running_or_notify_cancel():
+                    try:
+                        future.set_result(fn(*args, **kwargs))
+                    except BaseException as e:
+                        future.set_exception(e)
+            finally:
+                with self._cond:
+                    self.running -= 1
+
+JOB_EXECUTOR = PriorityExecutor(JOB_WORKERS, JOB_QUEUE_DEPTH)
+
+def _server_busy():
+    return JSONResponse(
+        {"error": "Server busy, please retry later"},
+        status_code=503,
+        headers={"Retry-After": str(RETRY_AFTER_SECONDS)}
+    )
+
+
+# ======================
+# METRICS
+# ======================
+# GET /metrics serves these in the Prometheus text format. Each finished run
+# (inline or background, including result-cache hits) is recorded once from
+# its StageTimer; the job gauges are read from JOB_EXECUTOR at scrape time.
+
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300]
+THROUGHPUT_BUCKETS = [1_000, 2_500, 5_000, 10_000, 25_000, 50_000, 100_000, 250_000, 500_000]
+
+METRICS = Registry()
+HTTP_SECONDS = METRICS.register(Histogram(
+    "email_cleaner_http_request_seconds", "HTTP request latency until the response starts.",
+    LATENCY_BUCKETS, ["method", "route", "status"]))
+RUN_SECONDS = METRICS.register(Histogram(
+    "email_cleaner_run_seconds", "Wall-clock seconds per cleaning run, upload included.",
+    LATENCY_BUCKETS, ["outcome"]))
+STAGE_SECONDS = METRICS.register(Histogram(
+    "email_cleaner_stage_seconds", "Seconds spent per pipeline stage.", LATENCY_BUCKETS, ["stage"]))
+RUN_ROWS_PER_SECOND = METRICS.register(Histogram(
+    "email_cleaner_run_rows_per_second", "Input rows cleaned per second of pipeline time, per run.",
+    THROUGHPUT_BUCKETS))
+ROWS = METRICS.register(Counter("email_cleaner_rows_total", "Input rows cleaned."))
+EMAILS = METRICS.register(Counter("email_cleaner_emails_total", "Candidate emails parsed from All Emails."))
+REJECTIONS = METRICS.register(Counter(
+    "email_cleaner_rejected_emails_total", "Emails dropped, by the rule that rejected them.", ["rule"]))
+SUPPRESSED = METRICS.register(Counter(
+    "email_cleaner_suppressed_emails_total", "Distinct valid emails dropped by the suppression index."))
+METRICS.register(Gauge(
+    "email_cleaner_jobs_in_flight", "Pipeline runs currently executing.", func=lambda: JOB_EXECUTOR.running))
+METRICS.register(Gauge(
+    "email_cleaner_jobs_queued", "Pipeline runs waiting for a worker.", func=lambda: JOB_EXECUTOR.queued))
+
+def run_counts(timer):
+    """
+    A run's counts as returned by the API: rows, emails, valid_emails,
+    rejected per rule and suppressed (distinct emails dropped by the index).
+    """
+    counts = timer.count_snapshot()
+    rejected = {name.removeprefix("rejected."): n for name, n in counts.items() if name.startswith("rejected.")}
+    emails = counts.get("emails", 0)
+    return {
+        "rows":         counts.get("rows", 0),
+        "emails":       emails,
+        "valid_emails": emails - sum(rejected.values()),
+        "rejected":     dict(sorted(rejected.items())),
+        "suppressed":   counts.get("suppressed", 0),
+    }
+
+def record_run(timer, outcome):
+    """Adds a finished run ("ok", "failed" or "cached") to the metrics."""
+    stages = timer.snapshot()
+    counts = run_counts(timer)
+    RUN_SECONDS.observe(sum(stages.values()), outcome=outcome)
+    for stage, seconds in stages.items():
+        STAGE_SECONDS.observe(seconds, stage=stage)
+    ROWS.inc(counts["rows"])
+    EMAILS.inc(counts["emails"])
+    for rule, n in counts["rejected"].items():
+        REJECTIONS.inc(n, rule=rule)
+    SUPPRESSED.inc(counts["suppressed"])
+    pipeline_seconds = sum(seconds for stage, seconds in stages.items() if stage != "upload")
+    if outcome == "ok" and counts["rows"] and pipeline_seconds:
+        RUN_ROWS_PER_SECOND.observe(counts["rows"] / pipeline_seconds)
+
+def run_recorded(input_path, input_format, output_target, timer, **options):
+    """run_pipeline, recording the run's outcome on the metrics."""
+    try:
+        summary_data = run_pipeline(input_path, input_format, output_target, timer=timer, **options)
+    except Exception:
+        record_run(timer, "failed")
+        raise
+    record_run(timer, "ok")
+    return summary_data
+
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    HTTP_SECONDS.observe(
+        time.perf_counter() - start,
+        method=request.method,
+        route=getattr(route, "path", "unmatched"),
+        status=str(response.status_code),
+    )
+    return response
+
+
+# ======================
+# BACKGROUND JOBS
+# ======================
+# With background=true the upload is saved, a job is queued on JOB_EXECUTOR
+# and the request returns its uid immediately. Jobs are independent of the
+# request, so they finish even if the client disconnects. Poll /jobs/{uid}.
+
+# Finished jobs are forgotten after this many seconds (their output files stay)
+JOB_RETENTION_SECONDS = int(os.getenv("JOB_RETENTION_SECONDS", "3600"))
+
+JOBS = {}
+_JOBS_LOCK = threading.Lock()
+
+def _update_job(uid, **fields):
+    with _JOBS_LOCK:
+        JOBS[uid].update(fields)
+
+def _prune_jobs():
+    cutoff = time.time() - JOB_RETENTION_SECONDS
+    with _JOBS_LOCK:
+        for uid in [u for u, job in JOBS.items() if job["finished"] and job["finished"] < cutoff]:
+            del JOBS[uid]
+
+def create_job(uid, timer):
+    _prune_jobs()
+    with _JOBS_LOCK:
+        JOBS[uid] = {
+            "state":          "queued",
+            "created":        time.time(),
+            "started":        None,
+            "finished":       None,
+            "rows_processed": 0,
+            "timer":          timer,
+            "stats":          None,
+            "error":          None,
+        }
+
+def discard_job(uid):
+    with _JOBS_LOCK:
+        JOBS.pop(uid, None)
+
+def _run_job(uid, on_done, input_path, input_format, output_target, **options):
+    timer = JOBS[uid]["timer"]
+
+    def progress(rows):
+        with _JOBS_LOCK:
+            JOBS[uid]["rows_processed"] += rows
+
+    _update_job(uid, state="running", started=time.time())
+    try:
+        stats = run_recorded(input_path, input_format, output_target, timer, progress=progress, **options)
+        if on_done:
+            on_done(stats)
+    except Exception as e:
+        _update_job(uid, state="failed", error=str(e), finished=time.time())
+    else:
+        _update_job(uid, state="done", stats=stats, finished=time.time())
+    finally:
+        discard_input(input_path)
+
+def finish_job(uid, timer, stats):
+    """Records an already-finished job (e.g. served from the result cache)."""
+    create_job(uid, timer)
+    _update_job(uid, state="done", stats=stats, finished=time.time())
+
+def job_status(uid):
+    """Public view of a job, or None if unknown."""
+    with _JOBS_LOCK:
+        job = JOBS.get(uid)
+        if job is None:
+            return None
+        status = {
+            "uid":            uid,
+            "state":          job["state"],
+            "rows_processed": job["rows_processed"],
+            "stages":         job["timer"].snapshot(),
+            "counts":         run_counts(job["timer"]),
+        }
+        if job["stats"] is not None:
+            status["stats"] = job["stats"]
+        if job["error"] is not None:
+            status["error"] = job["error"]
+    return status
+
+
+# ======================
+# RESULT CACHE
+# ======================
+# Results are cached by (uploaded bytes, rules version, output format), so
+# re-uploads of the same dump are answered without running the pipeline.
+# Engine/reader/writer/workers are not part of the key: they give the same output.
+# A run that applies a non-empty suppression index also keys on its id and
+# generation, so adding to (or recreating) the index invalidates earlier results.
+
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE", "1") != "0"
+RESULT_CACHE = ResultCache(
+    os.getenv("RESULT_CACHE_DIR", os.path.join(UPLOAD_DIR, "email_cleaner_cache")),
+    max_bytes=int(os.getenv("RESULT_CACHE_MAX_MB", "1024")) * 1024 * 1024,
+    max_age_seconds=int(os.getenv("RESULT_CACHE_MAX_AGE_HOURS", "24")) * 3600,
+)
+
+def result_cache_key(content_digest, output, suppression=None):
+    generation = suppression.current_generation() if suppression is not None else 0
+    extra = [f"suppression:{suppression.index_id:x}:{generation}"] if generation else []
+    return ResultCache.key(content_digest, rules_version(), output, *extra)
+
+def cache_result(key, output_path, output, stats, state_path=None):
+    ext, _ = OUTPUT_FORMATS[output]
+    RESULT_CACHE.put(key, output_path, output, ext, stats, state_path)
+
+
+# ======================
+# IN-MEMORY RESULTS
+# ======================
+# With storage=memory nothing is written to disk for a request: the upload
+# is spooled in memory (spilling to an anonymous temp file only above
+# SPOOL_MAX_MB), the output is built in a BytesIO and kept in MEMORY_RESULTS
+# until /download/{uid} fetches it. Meant for serverless hosts with a small /tmp.
+
+STORAGES = ["disk", "memory"]
+
+DEFAULT_STORAGE = os.getenv("CLEANER_STORAGE", "disk")
+
+class ResultTooLarge(Exception):
+    pass
+
+class MemoryResultStore:
+    """
+    Bounded in-process uid → (data, format) store. Entries expire after
+    ttl_seconds; when over max_bytes the oldest are dropped first. put()
+    raises ResultTooLarge for an entry that alone exceeds max_bytes, rather
+    than storing it only to evict it straight away.
+    """
+
+    def __init__(self, max_bytes, ttl_seconds):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries = collections.OrderedDict()  # uid -> (data, format, created), oldest first
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _expire(self):
+        now = time.time()
+        while self._entries:
+            uid, (data, _, created) = next(iter(self._entries.items()))
+            if self._bytes <= self.max_bytes and now - created <= self.ttl_seconds:
+                break
+            del self._entries[uid]
+            self._bytes -= len(data)
+
+    def put(self, uid, data, fmt):
+        if len(data) > self.max_bytes:
+            raise ResultTooLarge(
+                f"Result is {len(data) / 1024 / 1024:.1f} MB, more than the "
+                f"{self.max_bytes / 1024 / 1024:.0f} MB in-memory result store holds; "
+                "retry with storage=disk or download=true"
+            )
+        with self._lock:
+            self._entries[uid] = (data, fmt, time.time())
+            self._bytes += len(data)
+            self._expire()
+
+    def get(self, uid):
+        """Returns (data, format) for uid, or None if unknown or expired."""
+        with self._lock:
+            self._expire()
+            entry = self._entries.get(uid)
+            return entry[:2] if entry else None
+
+MEMORY_RESULTS = MemoryResultStore(
+    max_bytes=int(os.getenv("MEMORY_RESULTS_MAX_MB", "256")) * 1024 * 1024,
+    ttl_seconds=int(os.getenv("MEMORY_RESULTS_TTL_SECONDS", "900")),
+)
+
+def discard_input(source):
+    """Deletes an input file (or a list of them), or closes an in-memory one, once its run is over."""
+    if isinstance(source, list):
+        for item in source:
+            discard_input(item)
+    elif isinstance(source, str):
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(source)
+    else:
+        source.close()
+
+
+# ======================
+# UPLOADS
+# ======================
+
+GZIP_MAGIC = b"\x1f\x8b"
+
+async def iter_upload(file, max_bytes=None):
+    """
+    Yields an UploadFile's bytes in UPLOAD_CHUNK_SIZE chunks as they arrive.
+    Gzip-compressed uploads (detected by magic bytes) are decompressed on the fly.
+    Raises UploadTooLarge as soon as more than max_bytes would be yielded,
+    and InvalidUpload for corrupt or truncated gzip data.
+    """
+    if max_bytes is None:
+        max_bytes = MAX_UPLOAD_BYTES
+    written = 0
+    decompressor = None
+    try:
+        chunk = await file.read(UPLOAD_CHUNK_SIZE)
+        if chunk[:2] == GZIP_MAGIC:
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+        while chunk:
+            if decompressor is not None:
+                # Never inflate more than the remaining budget (+1 to detect overflow)
+                chunk = decompressor.decompress(chunk, max_bytes - written + 1)
+                if decompressor.unconsumed_tail:
+                    raise UploadTooLarge()
+            if written + len(chunk) > max_bytes:
+                raise UploadTooLarge()
+            written += len(chunk)
+            yield chunk
+            chunk = await file.read(UPLOAD_CHUNK_SIZE)
+
+        if decompressor is not None and not decompressor.eof:
+            raise InvalidUpload("Truncated gzip upload")
+    except zlib.error as e:
+        raise InvalidUpload(f"Invalid gzip upload: {e}")
+
+async def save_upload(file, target, max_bytes=None, hasher=None):
+    """
+    Streams an UploadFile to target (a path or binary file object) through
+    iter_upload, without holding it in memory. On UploadTooLarge or
+    InvalidUpload the partial upload is deleted (or closed) and the error
+    re-raised. Returns bytes written.
+    The written (decompressed) bytes are also fed to hasher, if given.
+    """
+    written = 0
+    try:
+        with _binary_output(target) as f:
+            async for chunk in iter_upload(file, max_bytes):
+                f.write(chunk)
+                if hasher is not None:
+                    hasher.update(chunk)
+                written += len(chunk)
+    except (UploadTooLarge, InvalidUpload):
+        discard_input(target)
+        raise
+
+    return written
+
+
+# ======================
+# API ENDPOINT
+# ======================
+
+@app.post("/process-excel/")
+async def process_excel(
+    file: list[UploadFile] = File(...),
+    engine: str = DEFAULT_ENGINE,
+    reader: str = DEFAULT_READER,
+    writer: str = DEFAULT_WRITER,
+    output: str = DEFAULT_OUTPUT_FORMAT,
+    download: bool = False,
+    background: bool = False,
+    workers: int = DEFAULT_WORKERS,
+    cache: bool = True,
+    baseline: Optional[str] = None,
+    storage: str = DEFAULT_STORAGE,
+    suppress: bool = True,
+):
+    """
+    Cleans an uploaded scraper dump (XLSX, CSV, Parquet or JSONL), or
+    several (repeated "file" fields) cleaned together as one. Returns
+    {uid, stats}, or with download=true the result itself (stats in the
+    X-Cleaner-Stats header). With background=true it returns 202 with the
+    uid as soon as the upload is stored; poll /jobs/{uid} for progress.
+    Identical re-uploads are answered from the result cache ("cached": true)
+    unless cache=false. baseline=<uid> merges the upload into that earlier
+    result, cleaning only the rows it does not already contain.
+    storage=memory keeps the upload and the result off disk.
+    Emails in the suppression index are dropped unless suppress=false.
+    """
+    for option, value, choices in (
+        ("engine", engine, ENGINES),
+        ("reader", reader, READERS),
+        ("writer", writer, WRITERS),
+        ("output", output, OUTPUT_FORMATS),
+        ("storage", storage, STORAGES),
+    ):
+        error = _choice_error(option, value, choices)
+        if error:
+            return error
+    if download and background:
+        return JSONResponse({"error": "download and background cannot be combined"}, status_code=400)
+    if len(file) > MAX_UPLOAD_FILES:
+        return JSONResponse({"error": f"Too many files (limit {MAX_UPLOAD_FILES})"}, status_code=400)
+
+    baseline_path = None
+    if baseline:
+        try:
+            baseline_path = state_path(uuid.UUID(baseline))
+        except ValueError:
+            return JSONResponse({"error": "Invalid baseline uid"}, status_code=400)
+        if not os.path.exists(baseline_path):
+            return JSONResponse({"error": "Baseline not found"}, status_code=404)
+
+    uid = str(uuid.uuid4())
+    timer = StageTimer()
+    in_memory = storage == "memory"
+    output_ext, output_media_type = OUTPUT_FORMATS[output]
+    output_path = f"{UPLOAD_DIR}/{uid}_output.{output_ext}"
+
+    # MAX_UPLOAD_MB caps all files of a request together
+    uploads, digests, input_size = [], [], 0
+    try:
+        with timer.stage("upload"):
+            for i, upload_file in enumerate(file):
+                upload = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES) if in_memory else f"{UPLOAD_DIR}/{uid}_input{i}.upload"
+                hasher = hashlib.sha256()
+                input_size += await save_upload(upload_file, upload, MAX_UPLOAD_BYTES - input_size, hasher)
+                uploads.append(upload)
+                digests.append(hasher.hexdigest())
+    except UploadTooLarge:
+        discard_input(uploads)
+        return JSONResponse({"error": f"File too large (limit {MAX_UPLOAD_BYTES // (1024 * 1024)} MB)"}, status_code=413)
+    except InvalidUpload as e:
+        discard_input(uploads)
+        return JSONResponse({"error": str(e)}, status_code=400)
+
+    # A delta's output depends on its baseline, so it is never cached
+    use_cache = cache and RESULT_CACHE_ENABLED and not baseline_path and not in_memory
+    content_digest = digests[0] if len(digests) == 1 else hashlib.sha256(":".join(digests).encode()).hexdigest()
+    # Opening loads the Bloom filter, so the first request does it off the event loop
+    suppression = await asyncio.to_thread(suppression_index) if suppress and SUPPRESSION_ENABLED else None
+    cache_key = result_cache_key(content_digest, output, suppression) if use_cache else None
+    keep_state = DELTA_STATE_ENABLED and not download and not in_memory
+    cached = RESULT_CACHE.get(cache_key) if cache_key else None
+    if cached:
+        discard_input(uploads)
+        record_run(timer, "cached")
+        if download:
+            return FileResponse(
+                cached["path"],
+                filename=f"cleaned_emails.{output_ext}",
+                media_type=output_media_type,
+                headers={"X-Cleaner-Stats": json.dumps(cached["stats"])}
+            )
+        link_or_copy(cached["path"], output_path)
+        if keep_state and cached.get("state"):
+            link_or_copy(cached["state"], state_path(uid))
+        if background:
+            finish_job(uid, timer, cached["stats"])
+        return JSONResponse({"uid": uid, "stats": cached["stats"], "timings": timer.snapshot(), "cached": True})
+
+    input_paths, input_formats = [], []
+    for i, (upload_file, upload) in enumerate(zip(file, uploads)):
+        if in_memory:
+            upload.seek(0)
+            input_formats.append(detect_input_format(upload_file.filename, upload.read(8)))
+            upload.seek(0)
+            input_paths.append(upload)
+        else:
+            # Give the input its real extension (openpyxl refuses unknown ones)
+            with open(upload, "rb") as f:
+                input_formats.append(detect_input_format(upload_file.filename, f.read(8)))
+            input_paths.append(f"{UPLOAD_DIR}/{uid}_input{i}.{input_formats[-1]}")
+            os.replace(upload, input_paths[-1])
+    if len(file) == 1:
+        input_path, input_format = input_paths[0], input_formats[0]
+    else:
+        input_path, input_format = input_paths, input_formats
+
+    options = {
+        "engine": engine, "reader": reader, "writer": writer, "output": output,
+        "workers": max(1, min(workers, POOL_SIZE)),
+        "state_path": state_path(uid) if keep_state else None,
+        "baseline_path": baseline_path,
+        "suppression": suppression,
+    }
+
+    # Build the result in a buffer when streaming it back or keeping it in memory — no output file
+    if in_memory:
+        target = io.BytesIO()
+    elif download:
+        target = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+    else:
+        target = output_path
+
+    def on_done(stats):
+        if download:
+            return
+        if in_memory:
+            try:
+                MEMORY_RESULTS.put(uid, target.getvalue(), output)
+            finally:
+                target.close()
+        elif cache_key:
+            cache_result(cache_key, output_path, output, stats, options["state_path"])
+
+    if background:
+        create_job(uid, timer)
+        try:
+            JOB_EXECUTOR.submit(input_size, _run_job, uid, on_done, input_path, input_format, target, **options)
+        except JobQueueFull:
+            discard_job(uid)
+            discard_input(input_path)
+            return _server_busy()
+        return JSONResponse({"uid": uid, "state": "queued"}, status_code=202)
+
+    try:
+        future = JOB_EXECUTOR.submit(input_size, run_recorded, input_path, input_format, target,
+                                     timer, **options)
+    except JobQueueFull:
+        discard_input(input_path)
+        return _server_busy()
+
+    try:
+        summary_data = await asyncio.wrap_future(future)
+    except (InvalidUpload, StaleBaseline) as e:
+        if not isinstance(target, str):
+            target.close()
+        return JSONResponse({"error": str(e)}, status_code=409 if isinstance(e, StaleBaseline) else 400)
+    finally:
+        discard_input(input_path)
+
+    try:
+        on_done(summary_data)
+    except ResultTooLarge as e:
+        return JSONResponse({"error": str(e)}, status_code=507)
+
+    if download:
+        return StreamingResponse(
+            _iter_file(target),
+            media_type=output_media_type,
+            headers={
+                "Content-Disposition": f'attachment; filename="cleaned_emails.{output_ext}"',
+                "X-Cleaner-Stats": json.dumps(summary_data),
+                "X-Cleaner-Timings": json.dumps(timer.snapshot()),
+                "X-Cleaner-Counts": json.dumps(run_counts(timer)),
+            }
+        )
 
     return JSONResponse({
         "uid": uid,
-        "stats": summary_data
+        "stats": summary_data,
+        "timings": timer.snapshot(),
+        "counts": run_counts(timer),
     })
 
+def _not_modified(request, etag):
+    """True when If-None-Match already names etag (or is "*")."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return "*" in tags or etag in tags
+
+def _byte_range(header, size):
+    """
+    Parses a single "bytes=" range into inclusive (start, end). Returns None
+    when the header is to be ignored (malformed or several ranges) and raises
+    ValueError when the range cannot be satisfied.
+    """
+    unit, _, spec = header.partition("=")
+    first, sep, last = spec.strip().partition("-")
+    if unit.strip() != "bytes" or not sep or not (first or last):
+        return None
+    if not all(part.isdigit() for part in (first, last) if part):
+        return None
+    if first:
+        start, end = int(first), int(last) if last else size - 1
+        if last and end < start:
+            return None
+    else:
+        if int(last) == 0:
+            raise ValueError("empty suffix range")
+        start, end = max(0, size - int(last)), size - 1
+    if start >= size:
+        raise ValueError("range starts past the end")
+    return start, min(end, size - 1)
+
+def _bytes_response(data, media_type, filename, request):
+    """Serves in-memory bytes with an ETag, If-None-Match and single-range Range support."""
+    etag = f'"{hashlib.sha1(data).hexdigest()}"'
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": f'attachment; filename="{filename}"',
+    }
+    range_header = request.headers.get("range")
+    if range_header and request.headers.get("if-range", etag) == etag:
+        try:
+            span = _byte_range(range_header, len(data))
+        except ValueError:
+            return Response(status_code=416, headers={"Content-Range": f"bytes */{len(data)}"})
+        if span:
+            start, end = span
+            headers["Content-Range"] = f"bytes {start}-{end}/{len(data)}"
+            return Response(data[start:end + 1], status_code=206, media_type=media_type, headers=headers)
+    return Response(data, media_type=media_type, headers=headers)
+
+def _file_etag(path):
+    stat = os.stat(path)
+    return f'"{hashlib.sha1(f"{path}:{stat.st_mtime_ns}:{stat.st_size}".encode()).hexdigest()}"'
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return JSONResponse(RESULT_CACHE.stats())
+
+@app.get("/metrics")
+async def metrics():
+    return Response(METRICS.render(), media_type=METRICS_CONTENT_TYPE)
+
+@app.get("/jobs/{uid}")
+async def get_job(uid: str):
+    status = job_status(uid)
+    if status is None:
+        return JSONResponse({"error": "Job not found"}, status_code=404)
+    return JSONResponse(status)
+
 @app.get("/download/{uid}")
 async def download_file(uid: str):
-    file_path = f"{UPLOAD_DIR}/{uid}_output.xlsx"
-    if os.path.exists(file_path):
+    status = job_status(uid)
+    if status is not None and status["state"] != "done":
+        return JSONResponse({"error": f"Job is {status['state']}", "state": status["state"]}, status_code=409)
+
+    in_memory = MEMORY_RESULTS.get(uid)
+    if in_memory:
+        data, fmt = in_memory
+        ext, media_type = OUTPUT_FORMATS[fmt]
+        return Response(
+            data,
+            media_type=media_type,
+            headers={"Content-Disposition": f'attachment; filename="cleaned_emails.{ext}"'}
+        )
+
+    file_path, fmt = find_output(uid)
+    if file_path:
+        ext, media_type = OUTPUT_FORMATS[fmt]
         return FileResponse(
             file_path,
-            filename="cleaned_emails.xlsx",
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+            filename=f"cleaned_emails.{ext}",
+            media_type=media_type
+        )
+    return JSONResponse({"error": "File not found"}, status_code=404)
+
+@app.get("/download/{uid}/{sheet}")
+async def download_sheet(uid: str, sheet: str, request: Request, fmt: str = Query("csv", alias="format")):
+    """
+    One sheet of a result as CSV or XLSX. Supports Range (resumable
+    downloads) and ETag / If-None-Match (304 when unchanged).
+    """
+    error = _choice_error("sheet", sheet, SHEET_NAMES) or _choice_error("format", fmt, SHEET_FORMATS)
+    if error:
+        return error
+    status = job_status(uid)
+    if status is not None and status["state"] != "done":
+        return JSONResponse({"error": f"Job is {status['state']}", "state": status["state"]}, status_code=409)
+
+    ext, media_type = SHEET_FORMATS[fmt]
+    filename = f"{sheet}.{ext}"
+
+    stored = MEMORY_RESULTS.get(uid)
+    if stored:
+        export_key = f"{uid}/{filename}"
+        export = MEMORY_RESULTS.get(export_key)
+        if export is None:
+            data, output_fmt = stored
+            buffer = io.BytesIO()
+            await asyncio.to_thread(export_sheet, io.BytesIO(data), output_fmt, sheet, fmt, buffer)
+            export = (buffer.getvalue(), fmt)
+            # An export too large to keep is still served, just rebuilt next time
+            with contextlib.suppress(ResultTooLarge):
+                MEMORY_RESULTS.put(export_key, *export)
+        return _bytes_response(export[0], media_type, filename, request)
+
+    output_path, output_fmt = find_output(uid)
+    if not output_path:
+        return JSONResponse({"error": "File not found"}, status_code=404)
+
+    export_path = f"{UPLOAD_DIR}/{uid}_{filename}"
+    if not os.path.exists(export_path):
+        tmp_path = f"{export_path}.{uuid.uuid4().hex}.tmp"
+        try:
+            await asyncio.to_thread(export_sheet, output_path, output_fmt, sheet, fmt, tmp_path)
+            os.replace(tmp_path, export_path)
+        finally:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(tmp_path)
+
+    etag = _file_etag(export_path)
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    # FileResponse handles Range / If-Range itself
+    return FileResponse(export_path, media_type=media_type, filename=filename, headers={"ETag": etag})
+
+
+# ======================
+# CLASSIFY API
+# ======================
+# Per-email verdicts without building a workbook: POST /classify takes a JSON
+# array of {name, emails, similar_emails, citations} records and answers with
+# one result per record. POST /classify/stream does the same for NDJSON (one
+# record per line), parsing the body as it arrives and streaming results back
+# batch by batch so memory stays flat however many records are sent. Its
+# batches run on JOB_EXECUTOR like cleaning runs, so a full queue sheds the
+# request with 503 + Retry-After instead of piling up threads.
+#
+# emails / similar_emails are comma-separated strings (as in the dumps) or
+# lists of strings. Each batch resolves its distinct emails with a single
+# email_verdicts call.
+
+CLASSIFY_BATCH_RECORDS = int(os.getenv("CLASSIFY_BATCH_RECORDS", "1000"))
+# Larger requests must use /classify/stream
+CLASSIFY_MAX_RECORDS = int(os.getenv("CLASSIFY_MAX_RECORDS", "10000"))
+# How often an admitted stream retries queueing its next batch while the queue is full
+CLASSIFY_QUEUE_POLL_SECONDS = 0.05
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+def _email_list(value, field):
+    if value is None or value == "":
+        return []
+    if isinstance(value, str):
+        return [e.strip() for e in value.split(",")]
+    if isinstance(value, list) and all(isinstance(e, str) for e in value):
+        return [e.strip() for e in value]
+    raise ValueError(f"'{field}' must be a comma-separated string or a list of strings")
+
+def parse_record(record):
+    """Validates one classify record; returns (name, emails, similar_emails, citations)."""
+    if not isinstance(record, dict):
+        raise ValueError("Each record must be a JSON object")
+    name = record.get("name")
+    if name is not None and not isinstance(name, str):
+        raise ValueError("'name' must be a string")
+    citations = record.get("citations")
+    if citations is not None and (isinstance(citations, bool) or not isinstance(citations, (int, float))):
+        raise ValueError("'citations' must be a number")
+    return (
+        name,
+        _email_list(record.get("emails"), "emails"),
+        set(_email_list(record.get("similar_emails"), "similar_emails")),
+        citations,
+    )
+
+def classify_records(records):
+    """Results for a batch of parsed records, resolving all their emails in one pass."""
+    verdicts = email_verdicts(email for _, emails, _, _ in records for email in emails)
+    results = []
+    for name, emails, similar_emails, citations in records:
+        cleaned = clean_name(name)
+        scores = name_similarity_scores(cleaned, emails)
+        results.append({
+            "name":         cleaned,
+            "name_missing": is_missing_name(cleaned),
+            "citations":    citations,
+            "emails": [
+                {
+                    "email":          email,
+                    "valid":          verdict.valid,
+                    "junk_reason":    verdict.reason,
+                    "domain":         verdict.domain,
+                    "country":        verdict.country,
+                    "name":           verdict.name,
+                    "relaxed_name":   verdict.relaxed_name,
+                    "listed_similar": email in similar_emails,
+                    "name_score":     score if verdict.valid else 0.0,
+                    "name_similar":   verdict.valid and score > 0,
+                }
+                for email, verdict, score in ((email, verdicts[email], score) for email, score in zip(emails, scores))
+            ],
+        })
+    return results
+
+def classify_ndjson_lines(lines, first_line):
+    """
+    NDJSON results for a batch of input lines (numbered from first_line).
+    A line that is not a valid record yields {"line", "error"} in its place.
+    """
+    parsed, out = [], []
+    for number, line in enumerate(lines, first_line):
+        if not line.strip():
+            continue
+        try:
+            parsed.append(parse_record(json.loads(line)))
+            out.append(None)
+        except ValueError as e:  # json.JSONDecodeError is a ValueError
+            out.append({"line": number, "error": str(e)})
+    results = iter(classify_records(parsed))
+    return "".join(json.dumps(item or next(results), ensure_ascii=False) + "\n" for item in out).encode()
+
+class _BodyReader:
+    """Request body with the UploadFile.read(size) interface iter_upload expects."""
+
+    def __init__(self, request):
+        self._stream = request.stream()
+        self._buffer = b""
+
+    async def read(self, size):
+        while len(self._buffer) < size:
+            chunk = await anext(self._stream, b"")
+            if not chunk:
+                break
+            self._buffer += chunk
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+async def _iter_body_lines(request):
+    """Lines of a (possibly gzipped) request body, decoded as UTF-8 as the body arrives."""
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    pending = []  # pieces of the unfinished last line, joined once it ends
+    async for chunk in iter_upload(_BodyReader(request)):
+        *lines, tail = decoder.decode(chunk).split("\n")
+        if lines:
+            lines[0] = "".join(pending) + lines[0]
+            pending = []
+        for line in lines:
+            yield line
+        pending.append(tail)
+    last = "".join(pending) + decoder.decode(b"", final=True)
+    if last:
+        yield last
+
+async def _iter_line_batches(lines):
+    batch = []
+    async for line in lines:
+        batch.append(line)
+        if len(batch) == CLASSIFY_BATCH_RECORDS:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def _submit_classify(lines, first_line):
+    """Queues one batch on JOB_EXECUTOR (prioritised by its size); raises JobQueueFull."""
+    return JOB_EXECUTOR.submit(sum(map(len, lines)), classify_ndjson_lines, lines, first_line)
+
+def _ndjson_error(message):
+    return (json.dumps({"error": message}) + "\n").encode()
+
+async def _iter_classified(batches, lines, future):
+    """
+    Streams the results of the already-queued first batch, then reads, queues
+    and streams the rest one batch at a time. Once the response has started,
+    a full queue delays the next batch rather than failing the request, and
+    an oversized or corrupt body ends the stream with an {"error"} line.
+    """
+    first_line = 1
+    try:
+        while True:
+            yield await asyncio.wrap_future(future)
+            first_line += len(lines)
+            try:
+                lines = await anext(batches, None)
+            except (UploadTooLarge, BodyTooLarge):
+                yield _ndjson_error(f"Body too large (limit {MAX_UPLOAD_BYTES // (1024 * 1024)} MB)")
+                return
+            except InvalidUpload as e:
+                yield _ndjson_error(str(e))
+                return
+            if lines is None:
+                return
+            while True:
+                try:
+                    future = _submit_classify(lines, first_line)
+                    break
+                except JobQueueFull:
+                    await asyncio.sleep(CLASSIFY_QUEUE_POLL_SECONDS)
+    finally:
+        await batches.aclose()
+
+@app.post("/classify")
+async def classify(request: Request):
+    """
+    Classifies a JSON array of records. Returns one {name, name_missing,
+    citations, emails: [...]} result per record, in order.
+    """
+    try:
+        records = await request.json()
+    except ValueError:
+        return JSONResponse({"error": "Body must be a JSON array of records"}, status_code=400)
+    if not isinstance(records, list):
+        return JSONResponse({"error": "Body must be a JSON array of records"}, status_code=400)
+    if len(records) > CLASSIFY_MAX_RECORDS:
+        return JSONResponse(
+            {"error": f"Too many records (limit {CLASSIFY_MAX_RECORDS}); use /classify/stream"},
+            status_code=413
         )
-    return JSONResponse({"error": "File not found"}, status_code=404)
\ No newline at end of file
+
+    parsed = []
+    for i, record in enumerate(records):
+        try:
+            parsed.append(parse_record(record))
+        except ValueError as e:
+            return JSONResponse({"error": f"Record {i}: {e}"}, status_code=400)
+
+    results = []
+    for start in range(0, len(parsed), CLASSIFY_BATCH_RECORDS):
+        results.extend(await asyncio.to_thread(classify_records, parsed[start:start + CLASSIFY_BATCH_RECORDS]))
+    return JSONResponse(results)
+
+@app.post("/classify/stream")
+async def classify_stream(request: Request):
+    """
+    Classifies NDJSON records (optionally gzipped), streaming one NDJSON
+    result per input line. Invalid lines yield {"line", "error"}.
+    """
+    batches = _iter_line_batches(_iter_body_lines(request))
+    try:
+        lines = await anext(batches, None)
+    except UploadTooLarge:
+        return JSONResponse({"error": f"Body too large (limit {MAX_UPLOAD_BYTES // (1024 * 1024)} MB)"}, status_code=413)
+    except InvalidUpload as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    if lines is None:
+        return Response(b"", media_type=NDJSON_MEDIA_TYPE)
+
+    try:
+        future = _submit_classify(lines, 1)
+    except JobQueueFull:
+        await batches.aclose()
+        return _server_busy()
+    return StreamingResponse(_iter_classified(batches, lines, future), media_type=NDJSON_MEDIA_TYPE)
+
+
+# ======================
+# SUPPRESSION API
+# ======================
+# POST /suppression fills the index from uploaded lists or from a stored
+# result's Final_Combined sheet. An upload may be an earlier result in any
+# output format (its Final_Combined sheet is read), a workbook, CSV or JSONL
+# with an Email column, or a plain list with one email per line.
+
+def _column_emails(rows):
+    """The values of the Email column (found by header), or else of the first column."""
+    rows = iter(rows)
+    header = next(rows, None)
+    if header is None:
+        return []
+    names = [str(h).strip().lower() if h is not None else "" for h in header]
+    if "email" in names:
+        i = names.index("email")
+        return [row[i] for row in rows if i < len(row) and isinstance(row[i], str)]
+    return [row[0] for row in itertools.chain([header], rows) if row and isinstance(row[0], str)]
+
+def read_suppression_list(f):
+    """Emails listed in an uploaded file (binary file object)."""
+    head = f.read(8)
+    f.seek(0)
+    if head.startswith(b"PK\x03\x04"):
+        with zipfile.ZipFile(f) as zf:
+            members = set(zf.namelist())
+        f.seek(0)
+        for fmt, member in (("csv", "Final_Combined.csv"), ("parquet", "Final_Combined.parquet")):
+            if member in members:
+                return _column_emails(iter_sheet_rows(f, fmt, "Final_Combined"))
+        wb = openpyxl.load_workbook(f, read_only=True, data_only=True)
+        try:
+            ws = wb["Final_Combined"] if "Final_Combined" in wb.sheetnames else wb.worksheets[0]
+            return _column_emails(ws.iter_rows(values_only=True))
+        finally:
+            wb.close()
+    if head.lstrip().startswith(b"{"):
+        emails = []
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                # Results tag each row with its sheet; only Final_Combined was exported
+                if record.get("Sheet", "Final_Combined") == "Final_Combined":
+                    emails.append(record.get("Email", record.get("email")))
+        return [email for email in emails if isinstance(email, str)]
+    text = io.TextIOWrapper(f, encoding="utf-8-sig", errors="replace", newline="")
+    try:
+        return _column_emails(csv.reader(text))
+    finally:
+        text.detach()
+
+def read_result_final_combined(uid):
+    """Final_Combined emails of a stored result, or None when there is no such result."""
+    stored = MEMORY_RESULTS.get(uid)
+    if stored:
+        data, fmt = stored
+        return _column_emails(iter_sheet_rows(io.BytesIO(data), fmt, "Final_Combined"))
+    output_path, fmt = find_output(uid)
+    if not output_path:
+        return None
+    return _column_emails(iter_sheet_rows(output_path, fmt, "Final_Combined"))
+
+@app.post("/suppression")
+async def add_suppression(file: Optional[list[UploadFile]] = File(None), uid: Optional[str] = None):
+    """
+    Adds the emails of uploaded lists (repeated "file" fields) and/or of the
+    stored result uid's Final_Combined sheet to the suppression index.
+    Returns how many were read, how many were new, and the index size.
+    """
+    if not SUPPRESSION_ENABLED:
+        return JSONResponse({"error": "The suppression index is disabled (SUPPRESSION_INDEX=0)"}, status_code=400)
+    if not file and not uid:
+        return JSONResponse({"error": "Upload a list (file) or name a result (uid)"}, status_code=400)
+
+    batches = []
+    if uid:
+        status = job_status(uid)
+        if status is not None and status["state"] != "done":
+            return JSONResponse({"error": f"Job is {status['state']}", "state": status["state"]}, status_code=409)
+        emails = await asyncio.to_thread(read_result_final_combined, uid)
+        if emails is None:
+            return JSONResponse({"error": "Result not found"}, status_code=404)
+        batches.append((f"result:{uid}", emails))
+
+    for upload_file in file or []:
+        upload = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+        try:
+            await save_upload(upload_file, upload)
+            upload.seek(0)
+            emails = await asyncio.to_thread(read_suppression_list, upload)
+        except UploadTooLarge:
+            return JSONResponse({"error": f"File too large (limit {MAX_UPLOAD_BYTES // (1024 * 1024)} MB)"}, status_code=413)
+        except (InvalidUpload, ValueError, KeyError, zipfile.BadZipFile) as e:
+            return JSONResponse({"error": f"Unreadable list {upload_file.filename}: {e}"}, status_code=400)
+        finally:
+            upload.close()
+        batches.append((f"upload:{upload_file.filename}", emails))
+
+    index = await asyncio.to_thread(suppression_index)
+    added = 0
+    for source, emails in batches:
+        added += await asyncio.to_thread(index.add, emails, source)
+    return JSONResponse({
+        "read":    sum(len(emails) for _, emails in batches),
+        "added":   added,
+        "entries": (await asyncio.to_thread(index.stats))["entries"],
+    })
+
+@app.get("/suppression/stats")
+async def suppression_stats():
+    if not SUPPRESSION_ENABLED:
+        return JSONResponse({"error": "The suppression index is disabled (SUPPRESSION_INDEX=0)"}, status_code=400)
+    index = await asyncio.to_thread(suppression_index)
+    return JSONResponse(await asyncio.to_thread(index.stats))
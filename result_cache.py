@@ -0,0 +1,140 @@
+"""
+Content-addressed cache of cleaning results.
+
+Entries are keyed by a hash of the uploaded bytes, the cleaning-rules version
+and any option that changes the output. Each entry is an output file (plus the
+run's delta state, when kept) and a small JSON sidecar holding the stats and
+last-access time. The cache is bounded by total size and entry age; when over
+budget, least-recently-used entries are evicted first.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+
+
+def link_or_copy(src, dst):
+    """Hard-links src to dst (no bytes copied), falling back to a copy across filesystems."""
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+class ResultCache:
+
+    def __init__(self, directory, max_bytes, max_age_seconds):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(content_digest, *parts):
+        return hashlib.sha256(":".join([content_digest, *map(str, parts)]).encode()).hexdigest()
+
+    def _meta_path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _read_meta(self, key):
+        try:
+            with open(self._meta_path(key), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_meta(self, key, meta):
+        tmp = self._meta_path(key) + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp, self._meta_path(key))
+
+    def get(self, key):
+        """
+        Returns the entry {"path", "state", "format", "stats"} for key, or None.
+        Counts a hit or miss and refreshes the entry's LRU position.
+        """
+        with self._lock:
+            meta = self._read_meta(key)
+            expired = meta and time.time() - meta["created"] > self.max_age_seconds
+            if not meta or expired or not os.path.exists(meta["path"]):
+                if meta:
+                    self._remove(key, meta)
+                self.misses += 1
+                return None
+            meta["accessed"] = time.time()
+            self._write_meta(key, meta)
+            self.hits += 1
+            return meta
+
+    def _store_file(self, src, name):
+        path = os.path.join(self.directory, name)
+        if os.path.exists(path):
+            os.remove(path)
+        link_or_copy(src, path)
+        return path
+
+    def put(self, key, output_path, fmt, ext, stats, state_path=None):
+        """
+        Stores output_path (linked, not copied, when possible) under key, then
+        enforces the bounds. An optional state file is kept alongside it.
+        """
+        with self._lock:
+            # Created on first store, so a disabled cache leaves no directory behind
+            os.makedirs(self.directory, exist_ok=True)
+            path = self._store_file(output_path, f"{key}.{ext}")
+            state = self._store_file(state_path, f"{key}.state") if state_path else None
+            now = time.time()
+            self._write_meta(key, {
+                "path":     path,
+                "state":    state,
+                "format":   fmt,
+                "stats":    stats,
+                "size":     os.path.getsize(path) + (os.path.getsize(state) if state else 0),
+                "created":  now,
+                "accessed": now,
+            })
+            self._evict()
+
+    def _entries(self):
+        if not os.path.isdir(self.directory):
+            return
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                key = name[:-len(".json")]
+                meta = self._read_meta(key)
+                if meta:
+                    yield key, meta
+
+    def _remove(self, key, meta):
+        for path in (meta.get("path"), meta.get("state"), self._meta_path(key)):
+            if path and os.path.exists(path):
+                os.remove(path)
+
+    def _evict(self):
+        now = time.time()
+        entries = sorted(self._entries(), key=lambda item: item[1]["accessed"])
+        total = sum(meta["size"] for _, meta in entries)
+        for key, meta in entries:
+            if total <= self.max_bytes and now - meta["created"] <= self.max_age_seconds:
+                continue
+            self._remove(key, meta)
+            total -= meta["size"]
+            self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            entries = list(self._entries())
+            return {
+                "hits":      self.hits,
+                "misses":    self.misses,
+                "evictions": self.evictions,
+                "entries":   len(entries),
+                "bytes":     sum(meta["size"] for _, meta in entries),
+            }
@@ -22,6 +22,11 @@ document.addEventListener('DOMContentLoaded', () => {
     dropZone.addEventListener('click', () => fileInput.click());
     fileInput.addEventListener('change', e => handleFiles(e.target.files));
 
+    // Background jobs only when the server opts in (UI_BACKGROUND_JOBS)
+    const config = fetch('/ui-config')
+        .then(response => response.ok ? response.json() : {})
+        .catch(() => ({}));
+
     function handleFiles(files) {
         if (files.length > 0) uploadFile(files[0]);
     }
@@ -42,14 +47,17 @@ document.addEventListener('DOMContentLoaded', () => {
         formData.append('file', file);
 
         try {
-            const response = await fetch('/process-excel/', {
+            // As a background job, large files don't hit request timeouts
+            const { background } = await config;
+            const response = await fetch(background ? '/process-excel/?background=true' : '/process-excel/', {
                 method: 'POST',
                 body: formData
             });
 
             if (!response.ok) throw new Error('Processing failed');
 
-            const data = await response.json();
+            const result = await response.json();
+            const data = background ? await waitForJob(result.uid) : result;
             displayResults(data);
 
         } catch (error) {
@@ -61,6 +69,26 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
+    // ──────────────────────────────────────────
+    // Job Polling
+    // ──────────────────────────────────────────
+    async function waitForJob(uid) {
+        const progressText = processingSection.querySelector('.subtitle');
+        while (true) {
+            const response = await fetch(`/jobs/${uid}`);
+            if (!response.ok) throw new Error('Job lookup failed');
+
+            const job = await response.json();
+            if (job.state === 'done') return job;
+            if (job.state === 'failed') throw new Error(job.error || 'Processing failed');
+
+            if (job.rows_processed > 0) {
+                progressText.textContent = `${job.rows_processed.toLocaleString()} rows processed`;
+            }
+            await new Promise(resolve => setTimeout(resolve, 1000));
+        }
+    }
+
     // ──────────────────────────────────────────
     // Display Results
     // ──────────────────────────────────────────
@@ -0,0 +1,207 @@
+"""
+Persistent suppression index of emails that earlier campaigns already used.
+
+An exact SQLite set of addresses, fronted by a Bloom filter so that the
+common case — an address that was never exported — is answered in memory
+without a database lookup. Only the filter's hits are confirmed against
+SQLite. Addresses match case-insensitively.
+
+The filter's bits are kept in <path>.bloom, stamped with the database's
+random id and generation (bumped by every add). They are rebuilt from the database when
+that file is missing or stale, or when the set outgrows the capacity the
+filter was sized for (capacity then doubles).
+"""
+
+import hashlib
+import math
+import os
+import secrets
+import sqlite3
+import struct
+import threading
+import time
+
+FALSE_POSITIVE_RATE = 0.01
+# Entries a new filter is sized for
+INITIAL_CAPACITY = 1_000_000
+
+# Stay well under SQLite's bound-parameter limit
+LOOKUP_CHUNK = 500
+
+# magic, bits, hashes, capacity, index id, generation
+_HEADER = struct.Struct("<8sQQQQQ")
+_MAGIC = b"SUPBLM01"
+
+
+def normalize(email):
+    return email.strip().lower()
+
+
+def _hashes(email):
+    """Two independent 64-bit hashes; position i is h1 + i * h2 (double hashing)."""
+    digest = hashlib.blake2b(email.encode("utf-8"), digest_size=16).digest()
+    return int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+
+
+class BloomFilter:
+
+    def __init__(self, capacity, error_rate=FALSE_POSITIVE_RATE, bits=None, hashes=None, data=None):
+        self.capacity = capacity
+        self.bits = bits or max(64, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = hashes or max(1, round(self.bits / capacity * math.log(2)))
+        self.data = data if data is not None else bytearray((self.bits + 7) // 8)
+
+    def add(self, email):
+        h1, h2 = _hashes(email)
+        data, bits = self.data, self.bits
+        for i in range(self.hashes):
+            position = (h1 + i * h2) % bits
+            data[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, email):
+        h1, h2 = _hashes(email)
+        data, bits = self.data, self.bits
+        for i in range(self.hashes):
+            position = (h1 + i * h2) % bits
+            if not data[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    def false_positive_rate(self, entries):
+        """Expected rate with `entries` addresses added."""
+        return (1 - math.exp(-self.hashes * entries / self.bits)) ** self.hashes
+
+
+class SuppressionIndex:
+
+    def __init__(self, path, error_rate=FALSE_POSITIVE_RATE):
+        self.path = path
+        self.bloom_path = path + ".bloom"
+        self.error_rate = error_rate
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS suppressed ("
+                " email TEXT PRIMARY KEY, source TEXT, added REAL NOT NULL) WITHOUT ROWID"
+            )
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            self._conn.execute("INSERT OR IGNORE INTO meta VALUES ('generation', 0)")
+            # Tells a recreated database apart from the one a .bloom file or cache key was made for
+            self._conn.execute("INSERT OR IGNORE INTO meta VALUES ('id', ?)", (secrets.randbits(63),))
+            self.index_id = self._conn.execute("SELECT value FROM meta WHERE key = 'id'").fetchone()[0]
+            self._load()
+
+    # Callers hold self._lock
+
+    def _db_generation(self):
+        return self._conn.execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()[0]
+
+    def _load(self):
+        """Brings the filter and entry count up to date with the database."""
+        self.generation = self._db_generation()
+        self.entries = self._conn.execute("SELECT COUNT(*) FROM suppressed").fetchone()[0]
+        try:
+            with open(self.bloom_path, "rb") as f:
+                magic, bits, hashes, capacity, index_id, generation = _HEADER.unpack(f.read(_HEADER.size))
+                data = bytearray(f.read())
+            if (magic == _MAGIC and index_id == self.index_id and generation == self.generation
+                    and len(data) == (bits + 7) // 8):
+                self._bloom = BloomFilter(capacity, bits=bits, hashes=hashes, data=data)
+                return
+        except (OSError, struct.error):
+            pass
+        self._rebuild(max(INITIAL_CAPACITY, 2 * self.entries))
+
+    def _rebuild(self, capacity):
+        bloom = BloomFilter(capacity, self.error_rate)
+        for (email,) in self._conn.execute("SELECT email FROM suppressed"):
+            bloom.add(email)
+        self._bloom = bloom
+        self._save()
+
+    def _save(self):
+        bloom = self._bloom
+        tmp = f"{self.bloom_path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, bloom.bits, bloom.hashes, bloom.capacity, self.index_id, self.generation))
+            f.write(bloom.data)
+        os.replace(tmp, self.bloom_path)
+
+    def _refresh(self):
+        # Another process may have added entries since
+        if self._db_generation() != self.generation:
+            self._load()
+
+    def add(self, emails, source=None):
+        """Adds addresses (any case); returns how many were not suppressed yet."""
+        emails = {normalize(email) for email in emails if email and "@" in email}
+        now = time.time()
+        with self._lock:
+            self._refresh()
+            expected = self.generation + 1
+            with self._conn:
+                before = self._conn.total_changes
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO suppressed (email, source, added) VALUES (?, ?, ?)",
+                    ((email, source, now) for email in emails),
+                )
+                added = self._conn.total_changes - before
+                if added:
+                    self._conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'generation'")
+            if not added:
+                return 0
+            if self._db_generation() != expected:
+                # Another process added entries meanwhile; start over from the database
+                self._load()
+                return added
+            self.generation = expected
+            self.entries += added
+            if self.entries > self._bloom.capacity:
+                self._rebuild(2 * self.entries)
+            else:
+                for email in emails:
+                    self._bloom.add(email)
+                self._save()
+        return added
+
+    def current_generation(self):
+        """The database's generation, picking up adds from other processes."""
+        with self._lock:
+            self._refresh()
+            return self.generation
+
+    def suppressed(self, emails):
+        """The given addresses (as given) that are in the index."""
+        with self._lock:
+            self._refresh()
+            if not self.entries:
+                return set()
+            candidates = {}
+            for email in emails:
+                key = normalize(email)
+                if key in self._bloom:
+                    candidates.setdefault(key, []).append(email)
+            keys = list(candidates)
+            found = set()
+            for start in range(0, len(keys), LOOKUP_CHUNK):
+                chunk = keys[start:start + LOOKUP_CHUNK]
+                rows = self._conn.execute(
+                    f"SELECT email FROM suppressed WHERE email IN ({', '.join('?' * len(chunk))})", chunk
+                )
+                found.update(email for (email,) in rows)
+        return {email for key in found for email in candidates[key]}
+
+    def stats(self):
+        with self._lock:
+            self._refresh()
+            bloom = self._bloom
+            return {
+                "entries":             self.entries,
+                "generation":          self.generation,
+                "bloom_bytes":         len(bloom.data),
+                "bloom_hashes":        bloom.hashes,
+                "bloom_capacity":      bloom.capacity,
+                "false_positive_rate": round(bloom.false_positive_rate(self.entries), 6),
+            }
@@ -0,0 +1,141 @@
+import csv
+import io
+import os
+import tempfile
+
+# Stores live in a fresh directory so earlier runs cannot leak into this one
+STORE_DIR = tempfile.mkdtemp(prefix="email_cleaner_test_")
+os.environ["RESULT_CACHE_DIR"] = os.path.join(STORE_DIR, "cache")
+os.environ["VERDICT_STORE_PATH"] = os.path.join(STORE_DIR, "verdicts.sqlite3")
+os.environ["SUPPRESSION_INDEX_PATH"] = os.path.join(STORE_DIR, "suppression.sqlite3")
+
+from fastapi.testclient import TestClient
+
+import main
+from generate_dump import iter_rows, write_dump
+
+client = TestClient(main.app)
+
+ROWS = 2000
+dump = list(iter_rows(ROWS, seed=11))
+
+def dump_file(name, rows):
+    path = os.path.join(STORE_DIR, name)
+    write_dump(path, rows)
+    return path
+
+xlsx = dump_file("dump.xlsx", dump)
+csv_path = dump_file("dump.csv", dump)
+jsonl = dump_file("dump.jsonl", dump)
+half = dump_file("half.xlsx", dump[:ROWS // 2])
+
+# Excel's "CSV UTF-8" puts a BOM before the header
+bom = os.path.join(STORE_DIR, "dump_bom.csv")
+with open(csv_path, "rb") as src, open(bom, "wb") as dst:
+    dst.write(b"\xef\xbb\xbf" + src.read())
+
+def run(path, query=""):
+    with open(path, "rb") as f:
+        response = client.post(f"/process-excel/?{query}", files={"file": (os.path.basename(path), f)})
+    if response.status_code != 200:
+        print(f"  {os.path.basename(path)} ?{query} -> {response.status_code} {response.text}")
+        return {}
+    return response.json()
+
+def _value(cell):
+    # Citations with gaps is a float column: CSV/JSONL outputs write 3851.0 where xlsx keeps 3851
+    try:
+        number = float(cell)
+    except ValueError:
+        return cell
+    return str(int(number)) if number.is_integer() else cell
+
+def sheets(uid):
+    """Every sheet of a result, as lists of CSV rows (none for a failed run)."""
+    if uid is None:
+        return {}
+    return {
+        sheet: [[_value(cell) for cell in row] for row in csv.reader(io.StringIO(
+            client.get(f"/download/{uid}/{sheet}?format=csv").text))]
+        for sheet in main.SHEET_NAMES
+    }
+
+failures = 0
+
+def check(label, ok):
+    global failures
+    failures += not ok
+    print(f"{label:56} | {'PASS' if ok else 'FAIL'}")
+
+# engine=core keeps no delta state, so it only runs pandas-free with storage=memory
+RUNS = [
+    "engine=columnar",
+    "engine=core&storage=memory",
+    "reader=stream",
+    "writer=stream",
+    "workers=2",
+    "engine=columnar&workers=2",
+    "output=csv",
+    "output=jsonl",
+    "output=parquet",
+    "engine=core&storage=memory&output=csv",
+    "engine=core&storage=memory&output=jsonl",
+]
+
+# JSON strings are kept as-is (pd.read_json), so "N/A" names stay names there;
+# every other input reads like the xlsx dump
+INPUTS = [(xlsx, xlsx), (csv_path, xlsx), (bom, xlsx), (jsonl, jsonl)]
+
+print("--- Testing Engine / Reader / Writer Equivalence ---")
+references = {path: sheets(run(path, "cache=false").get("uid")) for path in (xlsx, jsonl)}
+reference = references[xlsx]
+for path, expected in INPUTS:
+    for query in ([""] if path != expected else []) + RUNS:
+        result = sheets(run(path, f"cache=false&{query}").get("uid"))
+        check(f"{os.path.basename(path)} {query or '(defaults)'}", result == references[expected])
+
+print("\n--- Testing Delta Mode ---")
+baseline = run(half, "cache=false").get("uid")
+delta = run(xlsx, f"cache=false&baseline={baseline}")
+check("first half, then the full dump as a delta", sheets(delta.get("uid")) == reference)
+check("delta over itself adds nothing", sheets(run(xlsx, f"cache=false&baseline={delta.get('uid')}").get("uid")) == reference)
+
+# Rows i and i + 1 differ only in Citations, and the new dump edits both
+# counts in the baseline half; row i lists a similar email, so Similar_Name_Emails
+# keeps whichever of the two ends up more cited
+i = next(i for i, row in enumerate(dump) if row[2] and row[3] is not None)
+rows = list(dump)
+rows[i + 1] = (*rows[i][:3], 0)
+edited = list(rows)
+edited[i + 1] = (*edited[i + 1][:3], rows[i][3] + 1000)
+edited[i + 10] = (*edited[i + 10][:3], 5000)
+old_half = dump_file("old_half.xlsx", rows[:ROWS // 2])
+edited_path = dump_file("edited.xlsx", edited)
+for query in ["", "reader=stream"]:
+    baseline = run(old_half, f"cache=false&{query}").get("uid")
+    delta = run(edited_path, f"cache=false&{query}&baseline={baseline}")
+    check(f"edited Citations refresh their own rows {query}",
+          sheets(delta.get("uid")) == sheets(run(edited_path, "cache=false").get("uid")))
+
+print("\n--- Testing Suppression And Cache Invalidation ---")
+run(xlsx)
+check("identical re-upload is cached", run(xlsx).get("cached") is True)
+
+email_at = reference["Final_Combined"][0].index("Email")
+suppressed = {row[email_at] for row in reference["Final_Combined"][1::10]}
+listing = io.BytesIO(("Email\n" + "\n".join(sorted(suppressed)) + "\n").encode())
+response = client.post("/suppression", files={"file": ("suppressed.csv", listing)})
+check("suppression list accepted", response.status_code == 200 and response.json().get("added") == len(suppressed))
+
+# Engines share cache entries, so only the first run can show the invalidation
+for query in ["", "cache=false&engine=columnar", "cache=false&engine=core&storage=memory"]:
+    result = run(xlsx, query)
+    leaked = [
+        row for rows in sheets(result.get("uid")).values()
+        for row in rows[1:] if "Email" in rows[0] and row[rows[0].index("Email")] in suppressed
+    ]
+    check(f"suppressed emails dropped {query or '(defaults)'}",
+          not result.get("cached") and not leaked and result.get("counts", {}).get("suppressed") == len(suppressed))
+check("suppress=false matches the unsuppressed run", sheets(run(xlsx, "suppress=false").get("uid")) == reference)
+
+print(f"\n{failures} failure(s)")
@@ -0,0 +1,49 @@
+import csv
+import io
+import os
+import tempfile
+
+# Fresh runs only: no cached results, stored verdicts, delta state or suppression
+os.environ["RESULT_CACHE"] = "0"
+os.environ["VERDICT_STORE"] = "0"
+os.environ["DELTA_STATE"] = "0"
+os.environ["SUPPRESSION_INDEX"] = "0"
+
+from fastapi.testclient import TestClient
+
+import main
+from generate_dump import iter_rows, write_dump
+
+client = TestClient(main.app)
+
+# Every sheet exported as CSV from workbooks written by each writer (and by
+# engine=core, which writes its own workbook) must come out the same
+RUNS = ["writer=pandas", "writer=stream", "engine=core"]
+
+path = os.path.join(tempfile.gettempdir(), "email_cleaner_test_exports.xlsx")
+# Some rows have no Citations, so their last cell is empty
+write_dump(path, iter_rows(2000, seed=7))
+
+exports = {}
+for query in RUNS:
+    with open(path, "rb") as f:
+        response = client.post(f"/process-excel/?{query}", files={"file": (os.path.basename(path), f)})
+    uid = response.json()["uid"]
+    exports[query] = {
+        sheet: client.get(f"/download/{uid}/{sheet}?format=csv").text
+        for sheet in main.SHEET_NAMES
+    }
+
+print("--- Testing CSV Sheet Exports ---")
+failures = 0
+for sheet in main.SHEET_NAMES:
+    expected = exports[RUNS[0]][sheet]
+    for query in RUNS:
+        text = exports[query][sheet]
+        rows = list(csv.reader(io.StringIO(text)))
+        ragged = [row for row in rows if len(row) != len(rows[0])]
+        ok = text == expected and not ragged
+        failures += not ok
+        print(f"{sheet:22} | {query:14} | {len(rows) - 1:5} rows | ragged: {len(ragged):3} | {'PASS' if ok else 'FAIL'}")
+
+print(f"\n{failures} failure(s)")
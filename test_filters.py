@@ -1,4 +1,4 @@
-from main import is_junk_email, get_country
+from cleaner_core import is_junk_email, get_country
 
 # Test Data
 bad_emails = [
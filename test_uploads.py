@@ -0,0 +1,58 @@
+import os
+import time
+
+# Fresh runs only: no cached results, stored verdicts, delta state or suppression
+os.environ["RESULT_CACHE"] = "0"
+os.environ["VERDICT_STORE"] = "0"
+os.environ["DELTA_STATE"] = "0"
+os.environ["SUPPRESSION_INDEX"] = "0"
+
+from fastapi.testclient import TestClient
+
+import main
+
+client = TestClient(main.app, raise_server_exceptions=False)
+
+# Files no reader can make sense of must come back as 400, never a 500
+UPLOADS = {
+    "empty.xlsx":   b"",
+    "empty.csv":    b"",
+    "garbage.xlsx": bytes(range(256)) * 8,
+    "truncated.xlsx": b"PK\x03\x04" + b"\x00" * 100,
+    "garbage.parquet": b"PAR1garbagePAR1",
+    "ragged.csv":   b"Name,All Emails,Similar Emails,Citations\nA,a@b.com,,1\nB,b@c.com,,2,3,4\n",
+    "broken.jsonl": b'{"Name": "A", "All Emails": "a@b.com"\n',
+}
+
+QUERIES = ["", "reader=stream", "engine=core&storage=memory"]
+
+print("--- Testing Unreadable Uploads ---")
+failures = 0
+for filename, content in UPLOADS.items():
+    for query in QUERIES:
+        response = client.post(f"/process-excel/?{query}", files={"file": (filename, content)})
+        # The core reader tolerates ragged CSV rows (extra cells are ignored)
+        expected = {200, 400} if filename == "ragged.csv" and "core" in query else {400}
+        ok = response.status_code in expected and (response.status_code == 200 or "error" in response.json())
+        failures += not ok
+        print(f"{filename:16} | {query or '(defaults)':27} | {response.status_code} | {'PASS' if ok else 'FAIL'}")
+
+print("\n--- Testing Oversized In-Memory Results ---")
+# A result larger than the whole in-memory store is refused, not stored and evicted
+main.MEMORY_RESULTS.max_bytes = 1024
+dump = b"Name,All Emails,Similar Emails,Citations\nAnn Lee,ann.lee@uni.edu,,3\n"
+for query in ["storage=memory", "storage=memory&engine=core"]:
+    response = client.post(f"/process-excel/?{query}", files={"file": ("dump.csv", dump)})
+    ok = response.status_code == 507 and "storage=disk" in response.json().get("error", "")
+    failures += not ok
+    print(f"{query:44} | {response.status_code} | {'PASS' if ok else 'FAIL'}")
+
+uid = client.post("/process-excel/?storage=memory&background=true", files={"file": ("dump.csv", dump)}).json()["uid"]
+deadline = time.time() + 30
+while (status := client.get(f"/jobs/{uid}").json())["state"] not in ("done", "failed") and time.time() < deadline:
+    time.sleep(0.1)
+ok = status["state"] == "failed" and "storage=disk" in status.get("error", "")
+failures += not ok
+print(f"{'storage=memory&background=true':44} | {status['state']} | {'PASS' if ok else 'FAIL'}")
+
+print(f"\n{failures} failure(s)")
@@ -0,0 +1,69 @@
+"""
+Persistent per-email verdicts shared across runs.
+
+One SQLite row per (email, rules version) holding everything the cleaner
+derives from the address alone: validity, domain, country and the strict and
+relaxed extracted names, and the rejection rule of an invalid address. Rows
+written under any other rules version are purged when the store is opened, so
+a rules change invalidates them all; a store from an older schema is dropped.
+"""
+
+import sqlite3
+import threading
+
+FIELDS = ["valid", "domain", "country", "name", "relaxed_name", "reason"]
+
+# Bumped when the table's columns change (stored as PRAGMA user_version)
+SCHEMA_VERSION = 2
+
+# Stay well under SQLite's bound-parameter limit
+LOOKUP_CHUNK = 500
+
+
+class VerdictStore:
+
+    def __init__(self, path, rules):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            if self._conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+                self._conn.execute("DROP TABLE IF EXISTS verdicts")
+                self._conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS verdicts ("
+                " email TEXT NOT NULL, rules TEXT NOT NULL,"
+                " valid INTEGER NOT NULL, domain TEXT, country TEXT, name TEXT, relaxed_name TEXT,"
+                " reason TEXT, PRIMARY KEY (email, rules))"
+            )
+            self._conn.execute("DELETE FROM verdicts WHERE rules != ?", (rules,))
+
+    def lookup(self, emails, rules):
+        """Returns {email: (valid, domain, country, name, relaxed_name, reason)} for the stored emails."""
+        emails = list(emails)
+        found = {}
+        with self._lock:
+            for start in range(0, len(emails), LOOKUP_CHUNK):
+                chunk = emails[start:start + LOOKUP_CHUNK]
+                rows = self._conn.execute(
+                    f"SELECT email, {', '.join(FIELDS)} FROM verdicts"
+                    f" WHERE rules = ? AND email IN ({', '.join('?' * len(chunk))})",
+                    [rules, *chunk],
+                )
+                for email, valid, *rest in rows:
+                    found[email] = (bool(valid), *rest)
+        return found
+
+    def store(self, verdicts, rules):
+        """Saves {email: (valid, domain, country, name, relaxed_name, reason)} under rules."""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO verdicts (email, rules, {', '.join(FIELDS)})"
+                f" VALUES (?, ?, {', '.join('?' * len(FIELDS))})",
+                [(email, rules, *verdict) for email, verdict in verdicts.items()],
+            )
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM verdicts").fetchone()[0]
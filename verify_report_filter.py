@@ -1,4 +1,4 @@
-from main import is_junk_email
+from cleaner_core import is_junk_email
 
 test_emails = [
     "report@google.com",